@@ -2,16 +2,23 @@ import os
 import sys
 from types import SimpleNamespace
 
-from dodona.dodona_command import Judgement, Message, ErrorType, Tab, Context, TestCase, MessageFormat
+from dodona.dodona_command import Judgement, Message, ErrorType, Tab, Context, TestCase, MessageFormat, \
+    command_emitter
 from dodona.dodona_config import DodonaConfig, AssemblyLanguage
 from dodona.translator import Translator
-from evaluation.arguments import format_arguments
+from evaluation.arguments import check_buffer_files, format_arguments, harness_arguments, is_buffer_argument
 from exceptions.config_exceptions import UnknownArgumentTypeError
 from utils.file_loaders import text_loader
-from exceptions.evaluation_exceptions import ValidationError, TestRuntimeError
-from utils.messages import compile_error, report_test, config_error, unknown_argument_type
+from exceptions.evaluation_exceptions import ValidationError, TestRuntimeError, TestTimeLimitExceeded, \
+    TestLimitExceeded
+from utils.messages import compile_error, report_test, config_error, unknown_argument_type, tests_not_executed
 from evaluation.compilation import run_compilation
-from evaluation.run import run_test
+from evaluation.cost_model import format_cycles
+from evaluation.result_cache import ResultCache
+from evaluation.profiling import qemu_plugin_path, uses_native_timing
+from evaluation.run import TestResult, uses_qemu_plugin
+from evaluation.scheduler import TestScheduler, TimeBudget
+from utils.tracing import TRACE_FILE_NAME, span, start_tracing
 import json
 
 
@@ -53,6 +60,12 @@ def amend_submission(config: DodonaConfig):
     return submission_file, line_shift
 
 
+def passes_functional_checks(test: SimpleNamespace, test_result: TestResult) -> bool:
+    """Whether the test returned the expected value and output buffers, and respected the calling convention."""
+    return test_result.generated == str(test.expected_return_value) \
+        and not test_result.calling_convention_error and not test_result.output_errors
+
+
 def main():
     """
     Main judge method
@@ -60,6 +73,10 @@ def main():
     # Read config JSON from stdin
     config = DodonaConfig.from_json(sys.stdin)
 
+    # The time limit covers the whole judgement, including the compilation
+    time_budget = TimeBudget(config.time_limit)
+    result_cache = None
+
     with Judgement() as judge:
         # Perform sanity check
         config.sanity_check()
@@ -73,16 +90,62 @@ def main():
             config_error(judge, config.translator, str(e))
             return
 
+        command_emitter.pretty = config.pretty_output
+        if config.trace:
+            start_tracing(os.path.join(config.workdir, TRACE_FILE_NAME))
+
         # Counter for failed tests because this judge works a bit differently
         # Allows nicer feedback on Dodona (displays amount of failed tests)
         failed_tests = 0
+        time_limit_exceeded = False
+        # Whether any test exceeded its share of the time limit
+        test_timed_out = False
+        # Status of the first memory or output limit that was exceeded, if any
+        limit_exceeded = None
 
-        submission_file, line_shift = amend_submission(config)
+        with span("amend_submission"):
+            submission_file, line_shift = amend_submission(config)
 
         # Load test plan
         with open(os.path.join(config.resources, config.plan_name), "r") as plan_file:
             plan = json.load(plan_file, object_hook=lambda d: SimpleNamespace(**d))
 
+        # Plan policies to stop testing a submission that is clearly broken: after the given number of failed tests,
+        # or after the first test that crashed or exceeded a limit
+        stop_after_failures = getattr(plan, "stop_after_failures", None)
+        stop_on_crash = bool(getattr(plan, "stop_on_crash", False))
+        if stop_after_failures is not None and (type(stop_after_failures) is not int or stop_after_failures < 1):
+            config_error(judge, config.translator,
+                         f"stop_after_failures must be a positive integer, not {stop_after_failures!r}")
+            return
+
+        # Native timings are only judged against a budget per test, without one there would be nothing to report
+        if uses_native_timing(config):
+            missing = [index + 1 for index, test in enumerate(plan.tests) if not hasattr(test, "max_nanoseconds")]
+            if missing:
+                config_error(judge, config.translator, "the native performance backend needs max_nanoseconds for "
+                                                       f"every test, tests {', '.join(map(str, missing))} have none")
+                return
+
+        # The arguments of the tests must match the tested arguments, and their buffer files must exist
+        try:
+            harness_arguments(config.tested_arguments, plan.tests)
+            check_buffer_files(config.resources, plan.tests)
+        except UnknownArgumentTypeError as e:
+            unknown_argument_type(judge, config.translator, e.argument)
+            return
+        except ValueError as e:
+            config_error(judge, config.translator, str(e))
+            return
+
+        # A resubmission of the same code replays the earlier result. Native timings depend on the load of the machine,
+        # like timeouts, so those judgements are not cached
+        if config.result_cache_dir and not uses_native_timing(config):
+            result_cache = ResultCache(config, plan)
+            if result_cache.replay(judge):
+                return
+            result_cache.start_recording()
+
         # Compile code
         try:
             test_program_path = run_compilation(config, plan, submission_file)
@@ -90,8 +153,21 @@ def main():
             compile_error(judge, config, validation_error.msg, line_shift)
             return
 
+        # The QEMU plugin is built before the tests run, such that a failing build is reported once, with its output
+        if uses_qemu_plugin(config):
+            try:
+                qemu_plugin_path(config)
+            except ValueError as e:
+                config_error(judge, config.translator, str(e))
+                return
+
         # Run the tests
-        with Tab('Feedback'):
+        test_ids = range(len(plan.tests))
+        needs_measurement = None
+        if config.measure_passing_tests_only:
+            needs_measurement = lambda test_id, test_result: passes_functional_checks(plan.tests[test_id], test_result)
+        with Tab('Feedback'), TestScheduler(config.translator, test_program_path, config, test_ids, time_budget,
+                                            needs_measurement) as scheduler:
             # Put each testcase in a separate context
             for test_id, test in enumerate(plan.tests):
                 try:
@@ -100,11 +176,12 @@ def main():
                     unknown_argument_type(judge, config.translator, e.argument)
                     continue
                 test_name = f"{config.tested_function}({formatted_arguments})"
+                crashed = False
                 with Context() as test_context, TestCase(test_name, format=MessageFormat.CODE) as test_case:
                     expected = str(test.expected_return_value)
                     accepted = False
                     try:
-                        test_result = run_test(config.translator, test_program_path, test_id, config)
+                        test_result = scheduler.result(test_id)
                         accepted = test_result.generated == expected
 
                         # Return value test
@@ -115,21 +192,48 @@ def main():
                             accepted,
                         )
 
+                        # Output buffer tests
+                        for index, argument in enumerate(test.arguments):
+                            if is_buffer_argument(argument) and hasattr(argument, "expected"):
+                                offset = test_result.output_errors.get(index)
+                                accepted_output = offset is None
+                                accepted = accepted and accepted_output
+                                identical = config.translator.translate(Translator.Text.OUTPUT_BUFFER_IDENTICAL)
+                                report_test(
+                                    config.translator.translate(Translator.Text.OUTPUT_BUFFER, position=index + 1,
+                                                                name=argument.expected),
+                                    identical,
+                                    identical if accepted_output else config.translator.translate(
+                                        Translator.Text.OUTPUT_BUFFER_DIFFERENT, offset=offset),
+                                    accepted_output,
+                                )
+
                         # Time measurement test
                         if test_result.performance:
-                            # Combine the performance counters into a total number of cycles
-                            simulated_total_cycles = config.performance_cycle_factor_instructions * test_result.performance.instruction_count \
-                                                     + config.performance_cycle_factor_data_reads * test_result.performance.data_read_count \
-                                                     + config.performance_cycle_factor_data_writes * test_result.performance.data_write_count
+                            # Combine the performance counters into a total number of cycles, weighted by the cost model
+                            simulated_total_cycles = test_result.performance.cycles(config.cost_model)
                             accepted_cycles = simulated_total_cycles <= test.max_cycles
                             accepted = accepted and accepted_cycles
                             report_test(
                                 config.translator.translate(Translator.Text.MEASURED_CYCLES),
                                 config.translator.translate(Translator.Text.EXECUTED_IN_CYCLES, msg=f"<= {str(test.max_cycles)}"),
-                                config.translator.translate(Translator.Text.EXECUTED_IN_CYCLES, msg=str(simulated_total_cycles)),
+                                config.translator.translate(Translator.Text.EXECUTED_IN_CYCLES, msg=format_cycles(simulated_total_cycles)),
                                 accepted_cycles,
                             )
 
+                        # Native time measurement test, against the fastest sample as noise only adds time
+                        if test_result.timing:
+                            accepted_time = test_result.timing.min_nanoseconds <= test.max_nanoseconds
+                            accepted = accepted and accepted_time
+                            report_test(
+                                config.translator.translate(Translator.Text.MEASURED_TIME),
+                                config.translator.translate(Translator.Text.EXECUTED_IN_NANOSECONDS, msg=f"<= {str(test.max_nanoseconds)}"),
+                                config.translator.translate(Translator.Text.EXECUTED_IN_NANOSECONDS_MEDIAN,
+                                                            min=test_result.timing.min_nanoseconds,
+                                                            median=test_result.timing.median_nanoseconds),
+                                accepted_time,
+                            )
+
                         # Calling convention test
                         if test_result.calling_convention_error is not None:
                             accepted_calling_convention = not bool(test_result.calling_convention_error)
@@ -144,15 +248,54 @@ def main():
                     except TestRuntimeError as e:
                         with Message(str(e)):
                             pass
+                        crashed = True
+                    except TestLimitExceeded as e:
+                        with Message(str(e)):
+                            pass
+                        limit_exceeded = limit_exceeded or e.error_type
+                        crashed = True
+                    except TestTimeLimitExceeded as e:
+                        with Message(str(e)):
+                            pass
+                        test_timed_out = True
+                        # The test only used up its own share, unless the whole time limit is used up as well
+                        if time_budget.exhausted():
+                            time_limit_exceeded = True
+                        else:
+                            limit_exceeded = limit_exceeded or ErrorType.TIME_LIMIT_EXCEEDED
+                            crashed = True
 
                     test_context.accepted = accepted
                     test_case.accepted = accepted
                     if not accepted:
                         failed_tests += 1
 
-        status = ErrorType.CORRECT if failed_tests == 0 else ErrorType.WRONG
+                # Stop when the time limit is used up, as there is no time left for the remaining tests, or when the
+                # plan gives up on the submission
+                if time_limit_exceeded or (stop_on_crash and crashed) or (
+                        stop_after_failures is not None and 0 < failed_tests >= stop_after_failures):
+                    if test_id + 1 < len(plan.tests):
+                        tests_not_executed(config.translator, len(plan.tests) - test_id - 1)
+                    break
+
+        if time_limit_exceeded:
+            judge.status = config.translator.error_status(ErrorType.TIME_LIMIT_EXCEEDED)
+            judge.accepted = False
+            return
+
+        if failed_tests == 0:
+            status = ErrorType.CORRECT
+        elif limit_exceeded:
+            status = limit_exceeded
+        else:
+            status = ErrorType.WRONG
         judge.status = config.translator.error_status(status, amount=failed_tests)
 
+    # Only judgements that ran all their tests within the time limit are cached: compilation errors refer to the lines
+    # of the submission, and whether the time limit is exceeded depends on the load of the machine
+    if result_cache is not None and not test_timed_out:
+        result_cache.store(config.workdir)
+
 
 if __name__ == "__main__":
     main()
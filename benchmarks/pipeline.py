@@ -0,0 +1,217 @@
+"""
+Measures the wall time of every stage of the judge pipeline, for every assembly language whose toolchain is installed
+and for plans of increasing size, using a synthetic submission that adds its two arguments.
+
+Usage: python benchmarks/pipeline.py [--sizes 1 10 100] [--repeat N] [--output FILE]
+The results are written as JSON to FILE (default: pipeline-results.json), such that runs of different commits can be
+compared. Every result is the median wall time in seconds of a stage, over N repetitions.
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from os import path
+from types import SimpleNamespace
+
+JUDGE_DIRECTORY = path.dirname(path.dirname(path.abspath(__file__)))
+sys.path.insert(0, JUDGE_DIRECTORY)
+
+import assembly_judge  # noqa: E402
+from dodona.dodona_command import Context, TestCase, MessageFormat, command_emitter  # noqa: E402
+from dodona.dodona_config import AssemblyLanguage, DodonaConfig  # noqa: E402
+from dodona.translator import Translator  # noqa: E402
+from evaluation.compilation import determine_compile_command_and_options, run_compilation, write_main_file  # noqa: E402
+from evaluation.profiling import determine_valgrind, parse_cachegrind_output  # noqa: E402
+from evaluation.run import determine_emulator, run_test  # noqa: E402
+from utils.messages import report_test  # noqa: E402
+
+# A function that returns the sum of its two int arguments
+SUBMISSIONS = {
+    AssemblyLanguage.X86_32_ATT: "add:\n    movl 4(%esp), %eax\n    addl 8(%esp), %eax\n    ret\n",
+    AssemblyLanguage.X86_32_INTEL: "add:\n    mov eax, [esp + 4]\n    add eax, [esp + 8]\n    ret\n",
+    AssemblyLanguage.X86_64_ATT: "add:\n    movl %edi, %eax\n    addl %esi, %eax\n    ret\n",
+    AssemblyLanguage.X86_64_INTEL: "add:\n    mov eax, edi\n    add eax, esi\n    ret\n",
+    AssemblyLanguage.ARM_32: "add:\n    add r0, r0, r1\n    bx lr\n",
+    AssemblyLanguage.ARM_64: "add:\n    add w0, w0, w1\n    ret\n",
+}
+
+DEFAULT_SIZES = [1, 10, 100, 500]
+
+
+def toolchain_available(assembly_language: AssemblyLanguage) -> bool:
+    compile_command, _ = determine_compile_command_and_options(assembly_language)
+    emulator = determine_emulator(assembly_language)
+    return shutil.which(compile_command) is not None and (emulator is None or shutil.which(emulator) is not None)
+
+
+def valgrind_available(assembly_language: AssemblyLanguage) -> bool:
+    return shutil.which(determine_valgrind(assembly_language)) is not None
+
+
+def write_exercise(directory: str, assembly_language: AssemblyLanguage, size: int) -> dict:
+    """Writes a submission and a plan of size tests into directory, and returns the judge configuration for them."""
+    resources = path.join(directory, "resources")
+    workdir = path.join(directory, "workdir")
+    os.makedirs(resources)
+    os.makedirs(workdir)
+
+    source = path.join(directory, "submission.s")
+    with open(source, "w") as submission_file:
+        submission_file.write(SUBMISSIONS[assembly_language])
+    tests = [{"arguments": [i, i + 1], "expected_return_value": 2 * i + 1, "max_cycles": 100} for i in range(size)]
+    with open(path.join(resources, "plan.json"), "w") as plan_file:
+        json.dump({"tests": tests}, plan_file)
+
+    return {
+        "memory_limit": 500000000,
+        "time_limit": 600,
+        "programming_language": "assembly",
+        "natural_language": "en",
+        "resources": resources,
+        "source": source,
+        "judge": JUDGE_DIRECTORY,
+        "workdir": workdir,
+        "plan_name": "plan.json",
+        "assembly": assembly_language.value,
+        "tested_function": "add",
+        "tested_arguments": ["int", "int"],
+        "test_iterations": 1,
+        "measure_performance": False,
+        "performance_cycle_factor_instructions": 1,
+        "performance_cycle_factor_data_reads": 1,
+        "performance_cycle_factor_data_writes": 1,
+        "check_calling_convention": True,
+    }
+
+
+def load_config(raw_config: dict, **overrides) -> DodonaConfig:
+    config = DodonaConfig(**{**raw_config, **overrides})
+    config.translator = Translator.from_str(config.natural_language)
+    config.process_judge_specific_options()
+    return config
+
+
+def load_plan(config: DodonaConfig) -> SimpleNamespace:
+    with open(path.join(config.resources, config.plan_name)) as plan_file:
+        return json.load(plan_file, object_hook=lambda d: SimpleNamespace(**d))
+
+
+def emit_feedback(config: DodonaConfig, plan: SimpleNamespace):
+    """Emits the Dodona commands of a judgement in which all tests succeeded."""
+    for test in plan.tests:
+        expected = str(test.expected_return_value)
+        with Context() as test_context, TestCase(f"add({test.arguments})", format=MessageFormat.CODE) as test_case:
+            report_test(config.translator.translate(Translator.Text.RETURN_VALUE), expected, expected, True)
+            test_context.accepted = True
+            test_case.accepted = True
+    command_emitter.flush()
+
+
+def run_judge(raw_config: dict):
+    """Runs the whole judge, like Dodona does."""
+    previous_directory = os.getcwd()
+    os.chdir(raw_config["workdir"])
+    sys.stdin = io.StringIO(json.dumps(raw_config))
+    try:
+        assembly_judge.main()
+        command_emitter.flush()
+    finally:
+        sys.stdin = sys.__stdin__
+        os.chdir(previous_directory)
+
+
+def measure_stages(assembly_language: AssemblyLanguage, size: int) -> dict:
+    """Wall time in seconds of every stage of one judgement."""
+    timings = {}
+
+    def timed(stage: str, function, *args):
+        start = time.perf_counter()
+        result = function(*args)
+        timings[stage] = time.perf_counter() - start
+        return result
+
+    with tempfile.TemporaryDirectory() as directory:
+        raw_config = write_exercise(directory, assembly_language, size)
+        config = load_config(raw_config)
+        plan = load_plan(config)
+        test_ids = range(len(plan.tests))
+
+        submission_file, _ = timed("amend_submission", assembly_judge.amend_submission, config)
+        timed("render_template", write_main_file, config, plan)
+        program = timed("run_compilation", run_compilation, config, plan, submission_file)
+        timed("run_test", lambda: [run_test(config.translator, program, test_id, config) for test_id in test_ids])
+
+        if valgrind_available(assembly_language):
+            measured_config = load_config(raw_config, measure_performance=True)
+            timed("run_test_measured",
+                  lambda: [run_test(config.translator, program, test_id, measured_config) for test_id in test_ids])
+            timed("parse_cachegrind_output", lambda: [
+                parse_cachegrind_output(path.join(config.workdir, f"timing-{test_id}.out"), config.tested_function)
+                for test_id in test_ids
+            ])
+
+        timed("dodona_output", emit_feedback, config, plan)
+
+    with tempfile.TemporaryDirectory() as directory:
+        timed("end_to_end", run_judge, write_exercise(directory, assembly_language, size))
+
+    return timings
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=JUDGE_DIRECTORY, stdout=subprocess.PIPE,
+                              stderr=subprocess.DEVNULL, universal_newlines=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="number of tests of the plans")
+    parser.add_argument("--repeat", type=int, default=3, help="number of repetitions per measurement")
+    parser.add_argument("--output", default="pipeline-results.json", help="file to write the results to")
+    arguments = parser.parse_args()
+
+    # The Dodona output of the judge is not part of the benchmark output
+    command_emitter.stream = io.StringIO()
+
+    results = []
+    for assembly_language in AssemblyLanguage:
+        if not toolchain_available(assembly_language):
+            print(f"{assembly_language.value}: toolchain not found, skipped", file=sys.stderr)
+            continue
+        for size in arguments.sizes:
+            try:
+                repetitions = [measure_stages(assembly_language, size) for _ in range(arguments.repeat)]
+            except Exception as e:
+                reason = str(e).strip().splitlines()[-1:] or [type(e).__name__]
+                print(f"{assembly_language.value}, {size} tests: failed ({reason[0]}), skipped", file=sys.stderr)
+                continue
+            for stage in repetitions[0]:
+                seconds = statistics.median(repetition[stage] for repetition in repetitions)
+                results.append({"assembly": assembly_language.value, "tests": size, "stage": stage, "seconds": seconds})
+                print(f"{assembly_language.value:14} {size:5} tests  {stage:24} {seconds * 1000:10.1f} ms",
+                      file=sys.stderr)
+            command_emitter.stream.seek(0)
+            command_emitter.stream.truncate()
+
+    with open(arguments.output, "w") as output_file:
+        json.dump({
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "results": results,
+        }, output_file, indent=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Measures the startup cost of the judge: starting the interpreter and importing the judge, and loading the test harness
+template with and without Mako's module cache.
+
+Usage: python benchmarks/startup.py [--runs N] [--budget MILLISECONDS]
+Exits with a non-zero status if importing the judge takes longer than the budget.
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from os import path
+
+JUDGE_DIRECTORY = path.dirname(path.dirname(path.abspath(__file__)))
+TEMPLATE_PATH = path.join(JUDGE_DIRECTORY, "templates", "main.c.mako")
+
+# Interpreter start and judge import, in milliseconds. Set from measurements, with headroom for noisy machines: about
+# 300 ms (of which 45 ms is the interpreter itself), down from about 580 ms before Mako was imported lazily
+STARTUP_BUDGET = 400
+
+LOAD_TEMPLATE = "from evaluation.compilation import load_template; load_template({!r}, {!r})"
+
+
+def time_python(code: str, runs: int) -> float:
+    """Median wall time in milliseconds of running code in a fresh interpreter."""
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], cwd=JUDGE_DIRECTORY, check=True)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10, help="number of runs per measurement")
+    parser.add_argument("--budget", type=float, default=STARTUP_BUDGET, help="startup budget in milliseconds")
+    arguments = parser.parse_args()
+
+    interpreter = time_python("pass", arguments.runs)
+    startup = time_python("import assembly_judge", arguments.runs)
+    template_source = time_python(LOAD_TEMPLATE.format(TEMPLATE_PATH, None), arguments.runs)
+    with tempfile.TemporaryDirectory() as module_directory:
+        # The first load compiles the template into the module directory
+        time_python(LOAD_TEMPLATE.format(TEMPLATE_PATH, module_directory), 1)
+        template_module = time_python(LOAD_TEMPLATE.format(TEMPLATE_PATH, module_directory), arguments.runs)
+
+    print(f"interpreter:              {interpreter:8.1f} ms")
+    print(f"import judge:             {startup:8.1f} ms (budget {arguments.budget:.0f} ms)")
+    print(f"template from source:     {template_source:8.1f} ms")
+    print(f"template from module:     {template_module:8.1f} ms")
+
+    if startup > arguments.budget:
+        print(f"importing the judge exceeds the startup budget by {startup - arguments.budget:.1f} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
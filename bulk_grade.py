@@ -0,0 +1,168 @@
+"""
+Bulk grading: judges many submissions of one exercise, for example to regrade an exercise after its plan was fixed.
+
+Usage: python bulk_grade.py RESOURCES SUBMISSION... [--config CONFIG] [--output DIRECTORY] [--workers N]
+
+RESOURCES is the evaluation directory of the exercise, CONFIG its config.json (by default the one next to RESOURCES).
+The test harness is compiled once and shared through the harness cache, after which the submissions are assembled,
+linked and tested in parallel, each in a forked judge with its own workdir. The Dodona output of every submission is
+written to DIRECTORY/<submission path>.json, with the submission path relative to the common directory of all
+submissions and its directory separators replaced by underscores. Submissions whose paths give the same name get their
+index in the arguments as a suffix: DIRECTORY/<submission path>-<index>.json.
+If the judgement of a submission fails or does not close, the submission is listed on stderr and the exit status is 1.
+"""
+
+import argparse
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+from collections import Counter
+from os import path
+from types import SimpleNamespace
+from typing import List
+
+from dodona.dodona_config import DodonaConfig
+from dodona.translator import Translator
+from evaluation.compilation import HarnessCompilation, determine_compile_command_and_options
+from exceptions.evaluation_exceptions import ValidationError
+from judge_server import CLOSE_JUDGEMENT, JUDGE_DIRECTORY, exit_judgement, run_judgement, warm_up
+from utils.system import available_cpu_count
+
+# Run configuration fields that Dodona normally provides
+DEFAULT_RUN_CONFIG = {
+    "memory_limit": 500000000,
+    "time_limit": 10,
+    "programming_language": "assembly",
+    "natural_language": "en",
+    "plan_name": "plan.json",
+}
+
+
+def load_exercise_config(config_path: str) -> dict:
+    """Reads the evaluation settings of an exercise from its config.json."""
+    with open(config_path) as config_file:
+        exercise_config = json.load(config_file)
+    return exercise_config.get("evaluation", exercise_config)
+
+
+def run_config(exercise_config: dict, resources: str, source: str, workdir: str, harness_cache_dir: str) -> dict:
+    return {
+        **DEFAULT_RUN_CONFIG,
+        "harness_cache_dir": harness_cache_dir,
+        **exercise_config,
+        "resources": resources,
+        "source": source,
+        "judge": JUDGE_DIRECTORY,
+        "workdir": workdir,
+    }
+
+
+def build_harness(raw_config: dict):
+    """Compiles the test harness of the exercise into the harness cache."""
+    config = DodonaConfig.from_json(io.StringIO(json.dumps(raw_config)))
+    config.translator = Translator.from_str(config.natural_language)
+    config.process_judge_specific_options()
+    with open(path.join(config.resources, config.plan_name)) as plan_file:
+        plan = json.load(plan_file, object_hook=lambda d: SimpleNamespace(**d))
+    compile_command, compile_options = determine_compile_command_and_options(config.assembly)
+    HarnessCompilation(config, plan, compile_command, compile_options).wait()
+
+
+def result_names(submissions: List[str]) -> List[str]:
+    """
+    File names for the results of the submissions: their paths relative to their common directory, flattened.
+    Flattening can map different paths to the same name (a_b/x.s and a/b_x.s), those names get the index as a suffix.
+    """
+    submission_paths = [path.realpath(submission) for submission in submissions]
+    common_directory = path.commonpath([path.dirname(submission_path) for submission_path in submission_paths])
+    names = [path.relpath(submission_path, common_directory).replace(os.sep, "_") for submission_path in submission_paths]
+    counts = Counter(names)
+    return [f"{name}-{index}.json" if counts[name] > 1 else f"{name}.json" for index, name in enumerate(names)]
+
+
+def grade(raw_config: dict, result_path: str) -> int:
+    """Judges one submission in a forked child, returns the pid of the child."""
+    pid = os.fork()
+    if pid == 0:
+        exit_status = 0
+        try:
+            run_judgement(json.dumps(raw_config), open(result_path, "w"))
+        except Exception:
+            exit_status = 1
+            sys.excepthook(*sys.exc_info())
+        finally:
+            exit_judgement(exit_status)
+    return pid
+
+
+def judgement_closed(result_path: str) -> bool:
+    """Whether the Dodona output in the result file closes the judgement, i.e. whether the judgement completed."""
+    try:
+        with open(result_path, "rb") as result_file:
+            return CLOSE_JUDGEMENT in result_file.read()
+    except OSError:
+        return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("resources", help="evaluation directory of the exercise")
+    parser.add_argument("submissions", nargs="+", help="submission files")
+    parser.add_argument("--config", help="config.json of the exercise")
+    parser.add_argument("--output", default="results", help="directory to write the results to")
+    parser.add_argument("--workers", type=int, default=available_cpu_count(), help="number of parallel judgements")
+    arguments = parser.parse_args()
+
+    resources = path.realpath(arguments.resources)
+    exercise_config = load_exercise_config(arguments.config or path.join(path.dirname(resources), "config.json"))
+    os.makedirs(arguments.output, exist_ok=True)
+
+    with tempfile.TemporaryDirectory() as directory:
+        # Unless the exercise has a harness cache, the harness is shared through a temporary one
+        harness_cache_dir = path.join(directory, "harness-cache")
+        harness_workdir = path.join(directory, "harness")
+        os.makedirs(harness_workdir)
+        try:
+            build_harness(run_config(exercise_config, resources, "", harness_workdir, harness_cache_dir))
+        except ValidationError as e:
+            print(f"the test harness does not compile:\n{e.msg}", file=sys.stderr)
+            sys.exit(1)
+        warm_up()
+
+        # Workdir and index of the submission of every running judgement
+        running = {}
+        failed = []
+        names = result_names(arguments.submissions)
+        result_paths = [path.join(path.realpath(arguments.output), name) for name in names]
+
+        def finish_judgement():
+            pid, status = os.wait()
+            workdir, index = running.pop(pid)
+            shutil.rmtree(workdir, ignore_errors=True)
+            if os.waitstatus_to_exitcode(status) != 0 or not judgement_closed(result_paths[index]):
+                failed.append(index)
+
+        for index, submission in enumerate(arguments.submissions):
+            if len(running) >= arguments.workers:
+                finish_judgement()
+
+            workdir = path.join(directory, f"submission-{index}")
+            os.makedirs(workdir)
+            raw_config = run_config(exercise_config, resources, path.realpath(submission), workdir, harness_cache_dir)
+            running[grade(raw_config, result_paths[index])] = (workdir, index)
+
+        while running:
+            finish_judgement()
+
+    if failed:
+        print("the judgement of these submissions failed or did not close:", file=sys.stderr)
+        for index in sorted(failed):
+            print(f"  {arguments.submissions[index]} ({names[index]})", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,7 @@
 """report judge's results to Dodona using Dodona commands (partial JSON output)"""
 
+import atexit
+import io
 import json
 import sys
 from abc import ABC
@@ -87,6 +89,62 @@ class DodonaException(Exception):
         self.message = Message(*args, **kwargs) if len(args) > 0 or len(kwargs) > 0 else None
 
 
+class CommandEmitter:
+    """writes Dodona commands to stdout
+    Commands are serialized compactly into a buffer, which is written to stdout at the end of every
+    Context, Tab and Judgement, or as soon as it holds more than flush_threshold characters. This keeps
+    the number of writes low for plans with many tests, while Dodona still sees a context as soon as it
+    is complete. Set pretty to True to print indented JSON, which is easier to read when debugging.
+    While recording, every command is also kept compactly, one per line, such that it can be replayed.
+    """
+
+    DEFAULT_FLUSH_THRESHOLD = 64 * 1024
+
+    def __init__(self, stream=None, flush_threshold: int = DEFAULT_FLUSH_THRESHOLD, pretty: bool = False):
+        self.stream = stream
+        self.flush_threshold = flush_threshold
+        self.pretty = pretty
+        self.buffer = io.StringIO()
+        self.encoder = json.JSONEncoder(separators=(",", ":"))
+        self.pretty_encoder = json.JSONEncoder(indent=1, sort_keys=True)
+        self.recording: Optional[io.StringIO] = None
+
+    def emit(self, command: dict) -> None:
+        """serialize a command into the buffer, flushing if the buffer grew too large"""
+        encoded = self.encoder.encode(command)
+        if self.recording is not None:
+            self.recording.write(encoded)
+            self.recording.write("\n")
+        self.buffer.write(self.pretty_encoder.encode(command) if self.pretty else encoded)
+        self.buffer.write("\n")  # Next JSON fragment should be on new line
+        if self.buffer.tell() >= self.flush_threshold:
+            self.flush()
+
+    def start_recording(self) -> None:
+        self.recording = io.StringIO()
+
+    def stop_recording(self) -> str:
+        """stop recording, returns the commands recorded since start_recording"""
+        recorded = self.recording.getvalue()
+        self.recording = None
+        return recorded
+
+    def flush(self) -> None:
+        """write the buffered commands to stdout"""
+        if self.buffer.tell() == 0:
+            return
+        stream = self.stream or sys.stdout
+        stream.write(self.buffer.getvalue())
+        stream.flush()
+        self.buffer.seek(0)
+        self.buffer.truncate()
+
+
+command_emitter = CommandEmitter()
+# Commands emitted outside a Context, Tab or Judgement must not get lost
+atexit.register(command_emitter.flush)
+
+
 class DodonaCommand(ABC):
     """abstract class, parent of all Dodona commands
     This class provides all shared functionality for the Dodona commands. These commands
@@ -132,6 +190,9 @@ class DodonaCommand(ABC):
         """close message that is printed as JSON to stdout when exiting the 'with' block"""
         return {"command": f"close-{self.name()}", **self.close_args.__dict__}
 
+    # Whether the buffered commands are written to stdout after the close message
+    flush_on_close = False
+
     @staticmethod
     def __print_command(result: Union[None, dict]) -> None:
         """print the provided to stdout as JSON
@@ -139,8 +200,7 @@ class DodonaCommand(ABC):
         """
         if result is None:
             return
-        json.dump(result, sys.stdout, indent=1, sort_keys=True)
-        sys.stdout.write("\n")  # Next JSON fragment should be on new line
+        command_emitter.emit(result)
 
     def __enter__(self) -> SimpleNamespace:
         """print the start message when entering the 'with' block"""
@@ -189,6 +249,8 @@ class DodonaCommand(ABC):
             handled = False
 
         self.__print_command(self.close_msg())
+        if self.flush_on_close:
+            command_emitter.flush()
         return handled
 
 
@@ -218,6 +280,8 @@ class DodonaCommandWithStatus(DodonaCommandWithAccepted):
 class Judgement(DodonaCommandWithStatus):
     """Dodona Judgement"""
 
+    flush_on_close = True
+
     def handle_dodona_exception(self, exception: DodonaException) -> bool:
         """return True to prevent the exception from crashing Python and causing a non-zero exit code"""
         super().handle_dodona_exception(exception)
@@ -227,6 +291,8 @@ class Judgement(DodonaCommandWithStatus):
 class Tab(DodonaCommand):
     """Dodona Tab"""
 
+    flush_on_close = True
+
     def __init__(self, title: str, **kwargs):
         super().__init__(title=title, **kwargs)
 
@@ -234,6 +300,8 @@ class Tab(DodonaCommand):
 class Context(DodonaCommandWithAccepted):
     """Dodona Context"""
 
+    flush_on_close = True
+
 
 class TestCase(DodonaCommandWithAccepted):
     """Dodona TestCase"""
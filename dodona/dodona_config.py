@@ -6,6 +6,10 @@ from types import SimpleNamespace
 from typing import TextIO
 from enum import Enum
 
+from evaluation.cost_model import QEMU_PLUGIN_EVENTS, parse_cost_model, parse_cycle_factor
+from evaluation.process import DEFAULT_OUTPUT_LIMIT
+from utils.disk_cache import DiskCache
+
 
 class AssemblyLanguage(Enum):
     X86_32_ATT = "x86-32-at&t"
@@ -16,6 +20,12 @@ class AssemblyLanguage(Enum):
     ARM_64 = "arm-64"
 
 
+class PerformanceBackend(Enum):
+    VALGRIND = "valgrind"
+    QEMU_PLUGIN = "qemu-plugin"
+    NATIVE = "native"
+
+
 # pylint: disable=too-many-instance-attributes
 class DodonaConfig(SimpleNamespace):
     """a class for containing all Dodona Judge configuration
@@ -45,7 +55,54 @@ class DodonaConfig(SimpleNamespace):
         performance_cycle_factor_instructions:  The multiplication factor to use in computing the cycles for the instructions.
         performance_cycle_factor_data_reads:    The multiplication factor to use in computing the cycles for the data reads.
         performance_cycle_factor_data_writes:   The multiplication factor to use in computing the cycles for the data writes.
+        cost_model:                             Optional, the weight in cycles of every event, by its cachegrind name,
+                                                e.g. {"Ir": 1, "Dr": 1, "Dw": 1, "D1mr": 10, "DLmr": 100, "Bcm": 15}.
+                                                Replaces the cycle factors above. Cache misses (I1mr, D1mr, D1mw, ILmr,
+                                                DLmr, DLmw) and branch mispredictions (Bc, Bcm, Bi, Bim) are only
+                                                simulated when the cost model uses them. Weights may be fractional.
+        performance_backend:                    Optional, how performance is measured: "valgrind" (default) simulates
+                                                the program with cachegrind, "qemu-plugin" counts instructions and memory
+                                                accesses with a QEMU TCG plugin and is only available for ARM, "native"
+                                                times the calls natively with clock_gettime (after warm-up runs, over
+                                                several samples) and is only available for x86. With native timing,
+                                                every test needs a max_nanoseconds per call, which it is checked
+                                                against instead of its max_cycles.
+        measure_single_iteration:               Optional, with the valgrind performance backend, measure only the last
+                                                of the test_iterations calls of every test (with callgrind), instead of
+                                                all of them. The other calls run without instrumentation where possible,
+                                                and the measured cost is that of a single call.
         check_calling_convention:               Whether the calling convention should be checked.
+        parallel_tests:                         Optional, run the tests concurrently on as many workers as the container
+                                                has CPUs available. The results are still reported in plan order.
+        batch_tests:                            Optional, run all tests in a single process of the test program instead
+                                                of one process per test. Tests that did not complete because the program
+                                                crashed are rerun in isolation. When measuring performance, the batch
+                                                runs in a single callgrind session that records the cost of every test.
+        fork_server:                            Optional, start the test program once and fork it for every test that
+                                                runs in a process of its own, instead of executing the program (and its
+                                                emulator) anew for every test. Runs that measure performance with
+                                                valgrind or the qemu plugin still start a process per test.
+        harness_cache_dir:                      Optional, directory in which compiled test harnesses are cached, such
+                                                that submissions to the same exercise only need to be assembled and
+                                                linked. Defaults to the ASSEMBLY_JUDGE_CACHE_DIR environment variable;
+                                                caching is disabled if neither is set.
+        harness_cache_size:                     Optional, the maximum size in bytes of the harness cache.
+        result_cache_dir:                       Optional, directory in which the results of judgements are cached, such
+                                                that resubmitting the same code (ignoring comments and whitespace)
+                                                replays the earlier result without compiling or running anything.
+                                                Defaults to the ASSEMBLY_JUDGE_RESULT_CACHE_DIR environment variable;
+                                                caching is disabled if neither is set.
+        result_cache_size:                      Optional, the maximum size in bytes of the result cache.
+        output_limit:                           Optional, the maximum number of bytes a test may write to stdout and to
+                                                stderr each, before it is killed.
+        measure_passing_tests_only:             Optional, run the tests without measuring their performance first, and
+                                                only measure the tests that returned the expected value and respected
+                                                the calling convention.
+        pretty_output:                          Optional, print the Dodona commands as indented JSON instead of compact
+                                                JSON, for debugging.
+        trace:                                  Optional, record how long every stage of the judge takes and write it as
+                                                a Chrome trace (trace.json) in the workdir. Defaults to whether the
+                                                ASSEMBLY_JUDGE_TRACE environment variable is set.
     """
 
     def __init__(self, **kwargs):
@@ -67,11 +124,42 @@ class DodonaConfig(SimpleNamespace):
         self.tested_function = str(self.tested_function)
         self.test_iterations = int(self.test_iterations)
         self.measure_performance = bool(self.measure_performance)
-        if self.measure_performance:
-            self.performance_cycle_factor_instructions = int(self.performance_cycle_factor_instructions)
-            self.performance_cycle_factor_data_reads = int(self.performance_cycle_factor_data_reads)
-            self.performance_cycle_factor_data_writes = int(self.performance_cycle_factor_data_writes)
+        self.performance_backend = PerformanceBackend(getattr(self, "performance_backend", PerformanceBackend.VALGRIND.value))
+        if self.measure_performance and self.performance_backend == PerformanceBackend.NATIVE:
+            # Native timing does not count events
+            self.cost_model = {}
+        elif self.measure_performance:
+            if hasattr(self, "cost_model"):
+                self.cost_model = parse_cost_model(self.cost_model)
+            else:
+                self.cost_model = parse_cost_model({
+                    "Ir": parse_cycle_factor(self.performance_cycle_factor_instructions),
+                    "Dr": parse_cycle_factor(self.performance_cycle_factor_data_reads),
+                    "Dw": parse_cycle_factor(self.performance_cycle_factor_data_writes),
+                })
+        if self.performance_backend == PerformanceBackend.QEMU_PLUGIN:
+            if self.assembly not in (AssemblyLanguage.ARM_32, AssemblyLanguage.ARM_64):
+                raise ValueError("the qemu-plugin performance backend is only available for ARM")
+            if self.measure_performance and any(event not in QEMU_PLUGIN_EVENTS for event in self.cost_model):
+                raise ValueError(f"the qemu-plugin performance backend only counts {', '.join(QEMU_PLUGIN_EVENTS)}")
+        self.measure_single_iteration = bool(getattr(self, "measure_single_iteration", False))
+        if self.measure_single_iteration and self.performance_backend != PerformanceBackend.VALGRIND:
+            raise ValueError("measuring a single iteration is only available with the valgrind performance backend")
+        if self.performance_backend == PerformanceBackend.NATIVE and \
+                self.assembly in (AssemblyLanguage.ARM_32, AssemblyLanguage.ARM_64):
+            raise ValueError("the native performance backend is only available for x86")
         self.check_calling_convention = bool(self.check_calling_convention)
+        self.parallel_tests = bool(getattr(self, "parallel_tests", False))
+        self.batch_tests = bool(getattr(self, "batch_tests", False))
+        self.fork_server = bool(getattr(self, "fork_server", False))
+        self.harness_cache_dir = getattr(self, "harness_cache_dir", os.environ.get("ASSEMBLY_JUDGE_CACHE_DIR"))
+        self.harness_cache_size = int(getattr(self, "harness_cache_size", DiskCache.DEFAULT_MAX_SIZE))
+        self.result_cache_dir = getattr(self, "result_cache_dir", os.environ.get("ASSEMBLY_JUDGE_RESULT_CACHE_DIR"))
+        self.result_cache_size = int(getattr(self, "result_cache_size", DiskCache.DEFAULT_MAX_SIZE))
+        self.output_limit = int(getattr(self, "output_limit", DEFAULT_OUTPUT_LIMIT))
+        self.measure_passing_tests_only = bool(getattr(self, "measure_passing_tests_only", False))
+        self.pretty_output = bool(getattr(self, "pretty_output", False))
+        self.trace = bool(getattr(self, "trace", bool(os.environ.get("ASSEMBLY_JUDGE_TRACE"))))
 
     @classmethod
     def from_json(cls, json_file: TextIO) -> "DodonaConfig":
@@ -28,9 +28,17 @@ class Translator:
         RETURN_VALUE = auto()
         MEASURED_CYCLES = auto()
         EXECUTED_IN_CYCLES = auto()
+        MEASURED_TIME = auto()
+        EXECUTED_IN_NANOSECONDS = auto()
+        EXECUTED_IN_NANOSECONDS_MEDIAN = auto()
         CALLING_CONVENTION_VIOLATION = auto()
         CALLING_CONVENTION_MSG = auto()
+        OUTPUT_BUFFER = auto()
+        OUTPUT_BUFFER_IDENTICAL = auto()
+        OUTPUT_BUFFER_DIFFERENT = auto()
         MISSING_TEST_FUNCTION = auto()
+        TESTS_NOT_EXECUTED = auto()
+        RESULT_CACHE_HIT = auto()
         # normal text
         ERRORS = auto()
         WARNINGS = auto()
@@ -113,14 +121,22 @@ class Translator:
         Language.EN: {
             Text.FAILED_TESTS: "{amount} test(s) failed.",
             Text.CONFIG_ERROR: "Configuration error: {msg}.",
-            Text.UNKNOWN_ARGUMENT_TYPE: "Onbekend argumenttype: {type}.",
+            Text.UNKNOWN_ARGUMENT_TYPE: "Unknown argument type: {ty}.",
             # descriptions
             Text.RETURN_VALUE: "Return value",
             Text.MEASURED_CYCLES: "Number of clock cycles to execute your code",
             Text.EXECUTED_IN_CYCLES: "Executed in {msg} cycles",
+            Text.MEASURED_TIME: "Time per call to execute your code",
+            Text.EXECUTED_IN_NANOSECONDS: "Executed in {msg} ns",
+            Text.EXECUTED_IN_NANOSECONDS_MEDIAN: "Executed in {min} ns (median {median} ns)",
             Text.CALLING_CONVENTION_VIOLATION: "Calling convention was violated",
             Text.CALLING_CONVENTION_MSG: "{msg} was/were not preserved",
+            Text.OUTPUT_BUFFER: "Contents of argument {position} ({name})",
+            Text.OUTPUT_BUFFER_IDENTICAL: "Identical to the expected output",
+            Text.OUTPUT_BUFFER_DIFFERENT: "Differs from the expected output at byte {offset}",
             Text.MISSING_TEST_FUNCTION: "The to-be-tested function is missing (typo?).",
+            Text.TESTS_NOT_EXECUTED: "{amount} remaining test(s) were not executed.",
+            Text.RESULT_CACHE_HIT: "This result was taken from the result cache of an identical earlier submission.",
             # normal text
             Text.ERRORS: "Error(s)",
             Text.WARNINGS: "Warning(s)",
@@ -133,14 +149,22 @@ class Translator:
         Language.NL: {
             Text.FAILED_TESTS: "{amount} test(en) gefaald.",
             Text.CONFIG_ERROR: "Configuratiefout: {msg}.",
-            Text.UNKNOWN_ARGUMENT_TYPE: "Unknown argument type: {ty}.",
+            Text.UNKNOWN_ARGUMENT_TYPE: "Onbekend argumenttype: {ty}.",
             # descriptions
             Text.RETURN_VALUE: "Terugkeerwaarde",
             Text.MEASURED_CYCLES: "Aantal klokcycli om je code uit te voeren",
             Text.EXECUTED_IN_CYCLES: "Uitgevoerd in {msg} klokcycli",
+            Text.MEASURED_TIME: "Tijd per oproep om je code uit te voeren",
+            Text.EXECUTED_IN_NANOSECONDS: "Uitgevoerd in {msg} ns",
+            Text.EXECUTED_IN_NANOSECONDS_MEDIAN: "Uitgevoerd in {min} ns (mediaan {median} ns)",
             Text.CALLING_CONVENTION_VIOLATION: "Oproepconventie werd geschonden",
             Text.CALLING_CONVENTION_MSG: "{msg} werd(en) niet behouden",
+            Text.OUTPUT_BUFFER: "Inhoud van argument {position} ({name})",
+            Text.OUTPUT_BUFFER_IDENTICAL: "Identiek aan de verwachte uitvoer",
+            Text.OUTPUT_BUFFER_DIFFERENT: "Verschilt van de verwachte uitvoer vanaf byte {offset}",
             Text.MISSING_TEST_FUNCTION: "De te testen functie werd niet gevonden (typo?).",
+            Text.TESTS_NOT_EXECUTED: "{amount} overblijvende test(en) werd(en) niet uitgevoerd.",
+            Text.RESULT_CACHE_HIT: "Dit resultaat komt uit de resultatencache van een identieke eerdere indiening.",
             # normal text
             Text.ERRORS: "Fout(en)",
             Text.WARNINGS: "Waarschuwing(en)",
@@ -1,8 +1,33 @@
 import json
+import os
+from dataclasses import dataclass
+from types import SimpleNamespace
+from typing import List, Optional
 
 from exceptions.config_exceptions import UnknownArgumentTypeError
 
 
+@dataclass
+class HarnessArgument:
+    """
+    A test argument as the test harness passes it to the tested function: a scalar of the given type, or a buffer
+    passed as a pointer of the given type followed by its number of elements as length_type.
+    """
+    index: int
+    type: str
+    buffer: bool = False
+    length_type: Optional[str] = None
+
+
+def is_buffer_argument(argument) -> bool:
+    """
+    Buffer arguments refer to binary data files in the resources: {"buffer": input file, "expected": expected output}.
+    Without input file, the buffer starts zeroed with the size of the expected output. Without expected output, the
+    buffer is not checked.
+    """
+    return isinstance(argument, SimpleNamespace) and (hasattr(argument, "buffer") or hasattr(argument, "expected"))
+
+
 def format_argument(argument):
     if isinstance(argument, (int, float)):
         return str(argument)
@@ -10,6 +35,8 @@ def format_argument(argument):
         return str(argument).lower()
     elif isinstance(argument, str):
         return json.dumps(argument)
+    elif is_buffer_argument(argument):
+        return getattr(argument, "buffer", None) or argument.expected
     else:
         raise UnknownArgumentTypeError(argument)
 
@@ -17,3 +44,51 @@ def format_argument(argument):
 def format_arguments(arguments):
     return ', '.join(map(format_argument, arguments))
 
+
+def format_harness_arguments(arguments):
+    """Formats the arguments as the initializer of a test in the test harness, buffers are given by their files."""
+    formatted_arguments = []
+    for argument in arguments:
+        if is_buffer_argument(argument):
+            for file_name in (getattr(argument, "buffer", None), getattr(argument, "expected", None)):
+                formatted_arguments.append(json.dumps(file_name) if file_name is not None else "NULL")
+        else:
+            formatted_arguments.append(format_argument(argument))
+    return ', '.join(formatted_arguments)
+
+
+def check_buffer_files(resources: str, tests: List[SimpleNamespace]):
+    """Raises a ValueError if a buffer argument of the tests refers to a file that is not in the resources."""
+    for index, test in enumerate(tests):
+        for argument in test.arguments:
+            if not is_buffer_argument(argument):
+                continue
+            for file_name in (getattr(argument, "buffer", None), getattr(argument, "expected", None)):
+                if file_name is not None and not os.path.isfile(os.path.join(resources, file_name)):
+                    raise ValueError(f"the buffer file {file_name} of test {index + 1} is not in the resources")
+
+
+def harness_arguments(tested_arguments: List[str], tests: List[SimpleNamespace]) -> List[HarnessArgument]:
+    """
+    Matches the arguments of the tests with the parameter types of the tested function.
+    A buffer argument takes two parameters: the pointer and the number of elements.
+    """
+    example_arguments = tests[0].arguments if tests else []
+    arguments = []
+    parameter = 0
+    while parameter < len(tested_arguments):
+        index = len(arguments)
+        if index < len(example_arguments) and is_buffer_argument(example_arguments[index]):
+            if parameter + 1 >= len(tested_arguments):
+                raise ValueError(f"buffer argument {index + 1} needs a pointer and a length parameter")
+            arguments.append(HarnessArgument(index, tested_arguments[parameter], True, tested_arguments[parameter + 1]))
+            parameter += 2
+        else:
+            arguments.append(HarnessArgument(index, tested_arguments[parameter]))
+            parameter += 1
+
+    for test in tests:
+        if len(test.arguments) != len(arguments) or any(
+                is_buffer_argument(test.arguments[argument.index]) != argument.buffer for argument in arguments):
+            raise ValueError(f"the arguments {format_arguments(test.arguments)} do not match the tested arguments")
+    return arguments
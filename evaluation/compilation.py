@@ -1,13 +1,26 @@
 from dodona.dodona_config import AssemblyLanguage, DodonaConfig
-from evaluation.arguments import format_arguments
+from evaluation.arguments import format_harness_arguments, harness_arguments
+from evaluation.profiling import measures_single_iteration, uses_native_timing
 from exceptions.evaluation_exceptions import ValidationError
-from mako.template import Template
+from functools import lru_cache
 from types import SimpleNamespace
+from typing import Optional
 from os import path
+import json
+import shutil
 import subprocess
-import random
+import time
 
+from utils.disk_cache import DiskCache, content_hash
 from utils.file_loaders import text_loader
+from utils.tracing import record_span, span
+
+
+# Modules of the judge whose code renders the test harness, relative to the judge directory
+RENDERING_MODULES = ("evaluation/arguments.py", "evaluation/compilation.py")
+
+# Allocations of the submission go through the wrappers of the test harness, which notice when memory runs out
+LINK_OPTIONS = ["-Wl,--wrap=malloc,--wrap=calloc,--wrap=realloc,--wrap=mmap"]
 
 
 def determine_compile_command_and_options(assembly_language: AssemblyLanguage):
@@ -34,35 +47,143 @@ def determine_compile_command_and_options(assembly_language: AssemblyLanguage):
     return compile_command, compile_options
 
 
-def random_magic_number_generator():
-    return random.randint(-2 ** 63, 2 ** 63 - 1)
+def template_path(config: DodonaConfig) -> str:
+    return path.join(config.judge, "templates/main.c.mako")
+
+
+def calling_convention_trampoline_path(config: DodonaConfig) -> str:
+    """The calling convention trampoline for the architecture of the assembly language."""
+    match config.assembly:
+        case AssemblyLanguage.X86_32_ATT | AssemblyLanguage.X86_32_INTEL:
+            architecture = "x86-32"
+        case AssemblyLanguage.X86_64_ATT | AssemblyLanguage.X86_64_INTEL:
+            architecture = "x86-64"
+        case AssemblyLanguage.ARM_32:
+            architecture = "arm-32"
+        case AssemblyLanguage.ARM_64:
+            architecture = "arm-64"
+    return path.join(config.judge, "templates", "cc_trampoline", f"{architecture}.s")
+
+
+def template_module_directory(config: DodonaConfig) -> Optional[str]:
+    """Directory in which Mako keeps the compiled template modules, such that they are only compiled once."""
+    if not config.harness_cache_dir:
+        return None
+    return path.join(config.harness_cache_dir, "templates")
+
+
+@lru_cache(maxsize=8)
+def load_template(template_file_path: str, module_directory: Optional[str]):
+    # Mako is imported here, as it is only needed when the harness is not cached and it makes up a large share of
+    # the judge's import time
+    from mako.template import Template
+    return Template(filename=template_file_path, module_directory=module_directory)
 
 
 def write_main_file(config: DodonaConfig, plan: SimpleNamespace):
     """Writes the main.c file responsible as a wrapper for the submission code."""
-    template = Template(text_loader(path.join(config.judge, "templates/main.c.mako")))
+    with span("write_main_file"):
+        template = load_template(template_path(config), template_module_directory(config))
 
-    with open(path.join(config.workdir, "main.c"), "w") as main_file:
-        main_file.write(template.render(
-            tested_function=config.tested_function,
-            tested_arguments=config.tested_arguments,
-            test_iterations=config.test_iterations,
-            format_arguments=format_arguments,
-            random_magic_number_generator=random_magic_number_generator,
-            check_calling_convention=config.check_calling_convention,
-            plan=plan
-        ))
+        with open(path.join(config.workdir, "main.c"), "w") as main_file:
+            main_file.write(template.render(
+                tested_function=config.tested_function,
+                tested_arguments=config.tested_arguments,
+                arguments=harness_arguments(config.tested_arguments, plan.tests),
+                test_iterations=config.test_iterations,
+                format_harness_arguments=format_harness_arguments,
+                check_calling_convention=config.check_calling_convention,
+                calling_convention_trampoline=text_loader(calling_convention_trampoline_path(config)),
+                c_string=json.dumps,
+                native_timing=uses_native_timing(config),
+                measure_single_iteration=measures_single_iteration(config),
+                plan=plan
+            ))
 
 
-def run_compilation(config: DodonaConfig, plan: SimpleNamespace, submission_file_path: str) -> str:
-    """Writes the necessary files for compilation and invokes the (C) compiler."""
-    write_main_file(config, plan)
+def harness_cache_key(config: DodonaConfig, plan: SimpleNamespace, compile_command: str, compile_options: list) -> str:
+    """
+    Hashes everything the compiled test harness (main.o) depends on, including the code that renders it, such that a
+    judge update that renders the harness differently does not reuse the harnesses of the earlier version.
+    """
+    return content_hash((
+        text_loader(template_path(config)),
+        *(text_loader(path.join(config.judge, module)) for module in RENDERING_MODULES),
+        text_loader(calling_convention_trampoline_path(config)),
+        json.dumps(plan, default=vars, sort_keys=True),
+        config.tested_function,
+        json.dumps(config.tested_arguments),
+        str(config.test_iterations),
+        str(config.check_calling_convention),
+        str(uses_native_timing(config)),
+        str(measures_single_iteration(config)),
+        config.assembly.value,
+        compile_command,
+        *compile_options,
+    ))
 
-    compile_command, compile_options = determine_compile_command_and_options(config.assembly)
-    compile_options += [submission_file_path, path.join(config.workdir, "main.c"), "-o", "program"]
 
+class HarnessCompilation:
+    """
+    Renders and compiles the test harness into main.o in the background, or takes it from the harness cache if
+    possible. The submission can be assembled in the meantime.
+    """
+
+    def __init__(self, config: DodonaConfig, plan: SimpleNamespace, compile_command: str, compile_options: list):
+        self.config = config
+        self.object_path = path.join(config.workdir, "main.o")
+        self.process = None
+        self.cache = None
+        self.cache_key = None
+
+        if config.harness_cache_dir:
+            self.cache = DiskCache(config.harness_cache_dir, config.harness_cache_size)
+            self.cache_key = harness_cache_key(config, plan, compile_command, compile_options)
+            cached_object_path = self.cache.get(self.cache_key)
+            if cached_object_path is not None:
+                try:
+                    shutil.copyfile(cached_object_path, self.object_path)
+                    return
+                except OSError:
+                    # Another judge evicted the entry in the meantime, the harness is compiled as if it was not cached
+                    pass
+
+        write_main_file(config, plan)
+        self.start_time = time.perf_counter()
+        self.process = subprocess.Popen(
+            [compile_command, *compile_options, "-c", path.join(config.workdir, "main.c"), "-o", self.object_path],
+            cwd=config.workdir,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            universal_newlines=True,
+        )
+
+    def wait(self) -> str:
+        """Waits for the compilation to finish and returns the path of main.o."""
+        if self.process is None:
+            return self.object_path
+
+        _, stderr = self.process.communicate()
+        record_span("compile harness", self.start_time)
+        if self.process.returncode != 0:
+            raise ValidationError(self.config.translator, stderr, 0, -1)
+
+        if self.cache is not None:
+            self.cache.put(self.cache_key, self.object_path)
+
+        return self.object_path
+
+    def cancel(self):
+        """Stops the compilation if it is still running."""
+        if self.process is not None and self.process.poll() is None:
+            self.process.kill()
+            self.process.communicate()
+
+
+def run_compile_step(config: DodonaConfig, command: list):
+    """Runs one step of the compilation, raising a ValidationError with the compiler output if it fails."""
     compile_result = subprocess.run(
-        [compile_command] + compile_options,
+        command,
         cwd=config.workdir,
         stdout=subprocess.PIPE,
         stderr=subprocess.PIPE,
@@ -72,4 +193,27 @@ def run_compilation(config: DodonaConfig, plan: SimpleNamespace, submission_file
     if compile_result.returncode != 0:
         raise ValidationError(config.translator, compile_result.stderr, 0, -1)
 
+
+def run_compilation(config: DodonaConfig, plan: SimpleNamespace, submission_file_path: str) -> str:
+    """
+    Writes the necessary files for compilation and invokes the (C) compiler.
+    The harness is compiled while the submission is assembled, and both are linked afterwards. Most failing submissions
+    fail in the assembler, which is reported without waiting for the harness.
+    """
+    compile_command, compile_options = determine_compile_command_and_options(config.assembly)
+    harness_compilation = HarnessCompilation(config, plan, compile_command, compile_options)
+
+    submission_object_path = path.join(config.workdir, "submission.o")
+    try:
+        with span("assemble submission"):
+            run_compile_step(config, [compile_command, *compile_options, "-c", submission_file_path, "-o", submission_object_path])
+    except ValidationError:
+        harness_compilation.cancel()
+        raise
+
+    harness_object_path = harness_compilation.wait()
+    with span("link"):
+        run_compile_step(config, [compile_command, *compile_options, *LINK_OPTIONS, submission_object_path,
+                                  harness_object_path, "-o", "program"])
+
     return path.join(config.workdir, "program")
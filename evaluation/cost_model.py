@@ -0,0 +1,55 @@
+from types import SimpleNamespace
+from typing import Dict, Union
+
+# Weight of an event in cycles, fractional weights are allowed
+Weight = Union[int, float]
+
+
+# Events by their cachegrind and callgrind names. Only instruction reads are counted without simulations.
+INSTRUCTION_EVENTS = ("Ir",)
+# Counted with --cache-sim=yes: data reads and writes, and their misses in the first level caches and the last level cache
+CACHE_SIMULATION_EVENTS = ("Dr", "Dw", "I1mr", "D1mr", "D1mw", "ILmr", "DLmr", "DLmw")
+# Counted with --branch-sim=yes: conditional and indirect branches, and their mispredictions
+BRANCH_SIMULATION_EVENTS = ("Bc", "Bcm", "Bi", "Bim")
+EVENTS = INSTRUCTION_EVENTS + CACHE_SIMULATION_EVENTS + BRANCH_SIMULATION_EVENTS
+
+# Events the function counter QEMU plugin counts
+QEMU_PLUGIN_EVENTS = ("Ir", "Dr", "Dw")
+
+
+def parse_cost_model(cost_model: Union[Dict[str, Weight], SimpleNamespace]) -> Dict[str, Weight]:
+    """Reads a cost model from the config: the weight in cycles of every event, events without a weight cost nothing."""
+    if isinstance(cost_model, SimpleNamespace):
+        cost_model = vars(cost_model)
+    unknown_events = [event for event in cost_model if event not in EVENTS]
+    if unknown_events:
+        raise ValueError(f"unknown events in the cost model: {', '.join(unknown_events)} "
+                         f"(known events: {', '.join(EVENTS)})")
+    for event, weight in cost_model.items():
+        if isinstance(weight, bool) or not isinstance(weight, (int, float)):
+            raise ValueError(f"the weight of {event} in the cost model must be a number, not {weight!r}")
+    return {event: weight for event, weight in cost_model.items() if weight != 0}
+
+
+def parse_cycle_factor(factor: Union[str, Weight]) -> Weight:
+    """
+    Reads one of the legacy performance_cycle_factor_* options, which may be given as a string. Integral factors stay
+    integers, such that their cycle counts do too.
+    """
+    factor = float(factor)
+    return int(factor) if factor.is_integer() else factor
+
+
+def format_cycles(cycles: Weight) -> str:
+    """Formats a number of cycles for the feedback, fractional weights give cycles that are rounded to two decimals."""
+    if isinstance(cycles, float):
+        return f"{cycles:.2f}".rstrip("0").rstrip(".")
+    return str(cycles)
+
+
+def needs_cache_simulation(cost_model: Dict[str, Weight]) -> bool:
+    return any(event in CACHE_SIMULATION_EVENTS for event in cost_model)
+
+
+def needs_branch_simulation(cost_model: Dict[str, Weight]) -> bool:
+    return any(event in BRANCH_SIMULATION_EVENTS for event in cost_model)
@@ -0,0 +1,131 @@
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+import os
+import selectors
+import signal
+import subprocess
+import time
+
+
+# Default for the number of bytes that is captured per output stream of a process
+DEFAULT_OUTPUT_LIMIT = 1024 * 1024
+READ_CHUNK_SIZE = 64 * 1024
+
+
+@dataclass
+class ResourceLimits:
+    """Limits in bytes, None means unlimited"""
+    address_space: Optional[int] = None
+    stack: Optional[int] = None
+
+
+@dataclass
+class ProcessResult:
+    returncode: int
+    stdout: str
+    stderr: str
+    timed_out: bool
+    output_limit_exceeded: bool
+
+
+def kill_process_group(process: subprocess.Popen):
+    """Kills the process and everything it started (e.g. valgrind or qemu and the test program)."""
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+def apply_resource_limits(command: List[str], limits: ResourceLimits) -> List[str]:
+    """
+    Wraps the command in a shell that applies the limits before executing it.
+    A shell is used instead of preexec_fn, as the latter is not safe when tests are started from multiple threads.
+    """
+    settings = []
+    if limits.address_space is not None:
+        settings.append(f"ulimit -v {limits.address_space // 1024}")
+    if limits.stack is not None:
+        settings.append(f"ulimit -s {limits.stack // 1024}")
+    if not settings:
+        return command
+    return ["/bin/sh", "-c", "; ".join((*settings, 'exec "$@"')), "sh", *command]
+
+
+def _remaining(deadline: Optional[float]) -> Optional[float]:
+    return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+
+def _capture_output(process: subprocess.Popen, deadline: Optional[float],
+                    output_limit: int) -> Tuple[bytes, bytes, bool, bool]:
+    """
+    Reads stdout and stderr of the process as they are produced, until both are closed.
+    Stops early when the deadline passes or when a stream exceeds output_limit bytes. Never keeps more than
+    output_limit bytes per stream in memory.
+    :return: stdout, stderr, whether the deadline passed and whether the output limit was exceeded
+    """
+    buffers = {process.stdout: bytearray(), process.stderr: bytearray()}
+    with selectors.DefaultSelector() as selector:
+        for stream in buffers:
+            selector.register(stream, selectors.EVENT_READ)
+
+        while selector.get_map():
+            remaining = _remaining(deadline)
+            if remaining == 0:
+                return bytes(buffers[process.stdout]), bytes(buffers[process.stderr]), True, False
+
+            for key, _ in selector.select(remaining):
+                chunk = os.read(key.fd, READ_CHUNK_SIZE)
+                if not chunk:
+                    selector.unregister(key.fileobj)
+                    continue
+                buffer = buffers[key.fileobj]
+                buffer += chunk
+                if len(buffer) > output_limit:
+                    del buffer[output_limit:]
+                    return bytes(buffers[process.stdout]), bytes(buffers[process.stderr]), False, True
+
+    return bytes(buffers[process.stdout]), bytes(buffers[process.stderr]), False, False
+
+
+def run_process(command: List[str], cwd: str, env: Optional[Dict[str, str]] = None, timeout: Optional[float] = None,
+                limits: Optional[ResourceLimits] = None, output_limit: int = DEFAULT_OUTPUT_LIMIT) -> ProcessResult:
+    """
+    Runs the command in a process group of its own and captures its output, at most output_limit bytes per stream.
+    If the command does not finish within timeout seconds, or if it produces more output than allowed, the whole
+    process group is killed. The output it produced until then is still returned.
+    """
+    if limits is not None:
+        command = apply_resource_limits(command, limits)
+
+    process = subprocess.Popen(
+        command,
+        cwd=cwd,
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        start_new_session=True,
+    )
+
+    deadline = None if timeout is None else time.monotonic() + timeout
+    try:
+        stdout, stderr, timed_out, output_limit_exceeded = _capture_output(process, deadline, output_limit)
+        if not timed_out and not output_limit_exceeded:
+            try:
+                # The output may be closed before the process exits
+                process.wait(timeout=_remaining(deadline))
+            except subprocess.TimeoutExpired:
+                timed_out = True
+    finally:
+        if process.poll() is None:
+            kill_process_group(process)
+        process.stdout.close()
+        process.stderr.close()
+        process.wait()
+
+    return ProcessResult(
+        returncode=process.returncode,
+        stdout=stdout.decode(errors="replace"),
+        stderr=stderr.decode(errors="replace"),
+        timed_out=timed_out,
+        output_limit_exceeded=output_limit_exceeded,
+    )
@@ -0,0 +1,313 @@
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+from dodona.dodona_config import DodonaConfig, AssemblyLanguage, PerformanceBackend
+from evaluation.cost_model import Weight, needs_branch_simulation, needs_cache_simulation
+from os import path
+import glob
+import os
+import re
+import subprocess
+import tempfile
+
+from utils.disk_cache import content_hash
+
+
+# Function in the test program that marks the end of a test in batch mode, see templates/main.c.mako
+TEST_DONE_MARKER = "judge_test_done"
+# Function in the test program that makes the measured call when measuring a single iteration
+MEASURED_CALL_FUNCTION = "judge_measured_call"
+
+
+@dataclass
+class TestPerformance:
+    """The events counted in the tested function, by their cachegrind names, see evaluation/cost_model.py"""
+    events: Dict[str, int]
+
+    def cycles(self, cost_model: Dict[str, Weight]) -> Weight:
+        """The cost of the events in cycles, fractional if the cost model has fractional weights."""
+        return sum(weight * self.events.get(event, 0) for event, weight in cost_model.items())
+
+
+@dataclass
+class NativeTiming:
+    """Time per call of the tested function in nanoseconds, over the samples of the native timing backend"""
+    min_nanoseconds: int
+    median_nanoseconds: int
+
+
+def parse_native_timing(timing_verdict: str) -> Optional[NativeTiming]:
+    """Reads the timing verdict of a test record, see templates/main.c.mako."""
+    parts = timing_verdict.split()
+    if len(parts) != 2:
+        return None
+    return NativeTiming(min_nanoseconds=int(parts[0]), median_nanoseconds=int(parts[1]))
+
+
+def uses_native_timing(config: DodonaConfig) -> bool:
+    return config.measure_performance and config.performance_backend == PerformanceBackend.NATIVE
+
+
+def measures_single_iteration(config: DodonaConfig) -> bool:
+    return config.measure_performance and config.performance_backend == PerformanceBackend.VALGRIND \
+        and config.measure_single_iteration
+
+
+def determine_valgrind(assembly_language: AssemblyLanguage):
+    """Determine what Valgrind binary to use for the given assembly language."""
+    match assembly_language:
+        case AssemblyLanguage.ARM_32:
+            return "/opt/valgrind-arm32/bin/valgrind"
+        case AssemblyLanguage.ARM_64:
+            return "/opt/valgrind-aarch64/bin/valgrind"
+        case _:
+            return "valgrind"
+
+
+def valgrind_log_file_name(out_file_name: str) -> str:
+    return f"{out_file_name}.log"
+
+
+def valgrind_ran_out_of_memory(workdir: str, out_file_name: str) -> bool:
+    """Whether valgrind aborted the run because it could not allocate memory."""
+    try:
+        with open(path.join(workdir, valgrind_log_file_name(out_file_name))) as log_file:
+            return any("out of memory" in line for line in log_file)
+    except OSError:
+        return False
+
+
+def simulation_options(config: DodonaConfig) -> List[str]:
+    """Enables only the simulations whose events the cost model uses, instructions are always counted."""
+    return [f"--cache-sim={'yes' if needs_cache_simulation(config.cost_model) else 'no'}",
+            f"--branch-sim={'yes' if needs_branch_simulation(config.cost_model) else 'no'}"]
+
+
+def cachegrind_command(config: DodonaConfig, out_file_name: str) -> List[str]:
+    """Valgrind invocation that measures a single test with cachegrind."""
+    return [determine_valgrind(config.assembly),
+            "--tool=cachegrind",
+            *simulation_options(config),
+            f"--log-file={valgrind_log_file_name(out_file_name)}",
+            f"--cachegrind-out-file={out_file_name}",
+            "--quiet"]
+
+
+def parse_cachegrind_output(out_file_path: str, function: str) -> Optional[TestPerformance]:
+    """Reads the cost of the given function from a cachegrind output file."""
+    target = f"fn={function}\n"
+    events = []
+    # Find time measurement line for our tested function
+    with open(out_file_path) as cachegrind_out_file:
+        for line in cachegrind_out_file:
+            if line.startswith("events:"):
+                # Which events are counted depends on the enabled simulations
+                events = line.split()[1:]
+            elif line == target:
+                line = cachegrind_out_file.readline()
+                # Format: line number followed by the events
+                parts = line.split()
+                return TestPerformance(events=dict(zip(events, map(int, parts[1:]))))
+    return None
+
+
+def callgrind_batch_command(config: DodonaConfig, out_file_name: str) -> List[str]:
+    """
+    Valgrind invocation that measures all tests of a batch in one callgrind session.
+    Callgrind dumps (and resets) its costs every time a test finishes, such that there is one dump per test.
+    When measuring a single iteration, costs are only collected during the measured call of every test. This is also
+    used to measure a single test.
+    """
+    collect_options = []
+    if measures_single_iteration(config):
+        collect_options = ["--collect-atstart=no", f"--toggle-collect={MEASURED_CALL_FUNCTION}"]
+    return [determine_valgrind(config.assembly),
+            "--tool=callgrind",
+            *simulation_options(config),
+            *collect_options,
+            f"--dump-after={TEST_DONE_MARKER}",
+            "--dump-instr=no",
+            "--compress-strings=no",
+            "--compress-pos=no",
+            f"--log-file={valgrind_log_file_name(out_file_name)}",
+            f"--callgrind-out-file={out_file_name}",
+            "--quiet"]
+
+
+def parse_callgrind_dump(dump_file_path: str, function: str) -> Optional[TestPerformance]:
+    """Sums the exclusive cost of the given function in a callgrind dump, None if the dump is not a per-test dump."""
+    events = []
+    totals = None
+    current_function = None
+    skip_next_cost_line = False
+
+    with open(dump_file_path) as dump_file:
+        for line in dump_file:
+            line = line.rstrip("\n")
+            if line.startswith("desc: Trigger:") and TEST_DONE_MARKER not in line:
+                # The final dump at program termination does not belong to a test
+                return None
+            elif line.startswith("events:"):
+                events = line.split()[1:]
+                totals = [0] * len(events)
+            elif line.startswith("fn="):
+                # Recursion levels are separated as function'2, function'3, ...
+                current_function = line[3:].split("'")[0]
+            elif line.startswith("calls="):
+                # The cost line after a call is the inclusive cost of the callee
+                skip_next_cost_line = True
+            elif line[:1].isdigit():
+                if skip_next_cost_line:
+                    skip_next_cost_line = False
+                elif current_function == function and totals is not None:
+                    # Format: position followed by the events, trailing zeroes may be omitted
+                    for index, cost in enumerate(line.split()[1:]):
+                        totals[index] += int(cost)
+
+    if totals is None:
+        return None
+
+    return TestPerformance(events=dict(zip(events, totals)))
+
+
+def parse_callgrind_batch_output(workdir: str, out_file_name: str, function: str) -> List[TestPerformance]:
+    """Reads the per-test costs of a batch from its callgrind dumps, in the order in which the tests finished."""
+    dumps = []
+    for dump_file_path in glob.glob(path.join(workdir, glob.escape(out_file_name) + ".*")):
+        suffix = re.search(r"\.(\d+)$", dump_file_path)
+        if suffix is None:
+            continue
+        performance = parse_callgrind_dump(dump_file_path, function)
+        if performance is not None:
+            dumps.append((int(suffix.group(1)), performance))
+
+    dumps.sort(key=lambda dump: dump[0])
+    return [performance for _, performance in dumps]
+
+
+def determine_nm(assembly_language: AssemblyLanguage):
+    """Determine what nm binary to use for reading the symbols of a test program of the given assembly language."""
+    match assembly_language:
+        case AssemblyLanguage.ARM_32:
+            return "arm-linux-gnueabihf-nm"
+        case AssemblyLanguage.ARM_64:
+            return "aarch64-linux-gnu-nm"
+        case _:
+            return "nm"
+
+
+@lru_cache(maxsize=8)
+def _function_symbols(nm: str, program_path: str, modification_time: int) -> Dict[str, Tuple[int, int]]:
+    """Start address and end address (exclusive) of the function symbols of a program, cached per version of it."""
+    nm_result = subprocess.run(
+        [nm, "--defined-only", "--print-size", program_path],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        check=True,
+    )
+    symbols = {}
+    for line in nm_result.stdout.splitlines():
+        # Format: address size type name
+        parts = line.split()
+        if len(parts) == 4 and parts[2] in "tT":
+            # The lowest bit of a Thumb function's address only selects the instruction set
+            start = int(parts[0], 16) & ~1
+            symbols[parts[3]] = (start, start + int(parts[1], 16))
+    return symbols
+
+
+def symbol_address_range(nm: str, program_path: str, symbol: str) -> Tuple[int, int]:
+    """Returns the start address and the end address (exclusive) of a function of a statically linked program."""
+    symbols = _function_symbols(nm, program_path, os.stat(program_path).st_mtime_ns)
+    if symbol not in symbols:
+        raise ValueError(f"function {symbol} not found in {program_path}")
+    return symbols[symbol]
+
+
+def qemu_plugin_path(config: DodonaConfig) -> str:
+    """
+    Returns the path of the function counter QEMU plugin.
+    A prebuilt plugin can be provided with the ASSEMBLY_JUDGE_QEMU_PLUGIN environment variable, otherwise the plugin
+    is built from plugins/function_counter.c, in the harness cache if there is one.
+    Raises a ValueError with the compiler output if the plugin cannot be built.
+    """
+    prebuilt_plugin_path = os.environ.get("ASSEMBLY_JUDGE_QEMU_PLUGIN")
+    if prebuilt_plugin_path:
+        return prebuilt_plugin_path
+
+    source_path = path.join(config.judge, "plugins", "function_counter.c")
+    with open(source_path, "rb") as source_file:
+        source_hash = content_hash((source_file.read(),))
+    output_directory = config.harness_cache_dir or config.workdir
+    plugin_path = path.join(output_directory, f"function_counter-{source_hash[:16]}.so")
+    if path.exists(plugin_path):
+        return plugin_path
+
+    # QEMU's plugin header includes glib
+    try:
+        glib_flags = subprocess.run(
+            ["pkg-config", "--cflags", "glib-2.0"],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            universal_newlines=True,
+        ).stdout.split()
+    except OSError:
+        # Without pkg-config, the compiler reports the missing glib headers
+        glib_flags = []
+    os.makedirs(output_directory, exist_ok=True)
+    file_descriptor, temporary_path = tempfile.mkstemp(dir=output_directory, prefix=".tmp-", suffix=".so")
+    os.close(file_descriptor)
+    try:
+        build_result = subprocess.run(
+            ["gcc", "-shared", "-fPIC", "-O2", *glib_flags, source_path, "-o", temporary_path],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            universal_newlines=True,
+        )
+        build_output = build_result.stderr
+        built = build_result.returncode == 0
+    except OSError as e:
+        build_output = str(e)
+        built = False
+    if not built:
+        os.unlink(temporary_path)
+        raise ValueError(f"the QEMU plugin could not be built:\n{build_output}")
+    os.replace(temporary_path, plugin_path)
+    return plugin_path
+
+
+def qemu_plugin_arguments(config: DodonaConfig, test_program_path: str, out_file_name: str) -> List[str]:
+    """
+    Emulator arguments that load the function counter plugin for the tested function.
+    The end of every test in batch mode is marked by the execution of judge_test_done.
+    """
+    nm = determine_nm(config.assembly)
+    start, end = symbol_address_range(nm, test_program_path, config.tested_function)
+    marker, _ = symbol_address_range(nm, test_program_path, TEST_DONE_MARKER)
+    plugin_arguments = [
+        qemu_plugin_path(config),
+        f"start={start:x}",
+        f"end={end:x}",
+        f"marker={marker:x}",
+        f"outfile={path.join(config.workdir, out_file_name)}",
+    ]
+    return ["-plugin", ",".join(plugin_arguments)]
+
+
+def parse_qemu_plugin_output(out_file_path: str) -> Tuple[List[TestPerformance], Optional[TestPerformance]]:
+    """Reads the counters of the function counter plugin: those of every finished test, and those at program exit."""
+    per_test = []
+    at_exit = None
+    with open(out_file_path) as out_file:
+        for line in out_file:
+            # Format: kind instructions loads stores
+            parts = line.split()
+            if len(parts) != 4:
+                continue
+            performance = TestPerformance(events={"Ir": int(parts[1]), "Dr": int(parts[2]), "Dw": int(parts[3])})
+            if parts[0] == "test":
+                per_test.append(performance)
+            elif parts[0] == "exit":
+                at_exit = performance
+    return per_test, at_exit
@@ -0,0 +1,162 @@
+import json
+from os import path
+from types import SimpleNamespace
+
+from dodona.dodona_command import command_emitter
+from dodona.dodona_config import AssemblyLanguage, DodonaConfig
+from evaluation.arguments import is_buffer_argument
+from evaluation.compilation import calling_convention_trampoline_path, template_path
+from utils.disk_cache import DiskCache, content_hash
+from utils.file_loaders import text_loader
+from utils.messages import result_cache_hit
+
+# Version of the judge's feedback, to be increased whenever the judge reports differently on the same submission,
+# such that results of earlier versions are not replayed
+JUDGE_VERSION = "1"
+
+# Options that do not influence the outcome of a judgement
+RUN_SPECIFIC_OPTIONS = {
+    "source", "workdir", "judge", "translator", "harness_cache_dir", "harness_cache_size", "result_cache_dir",
+    "result_cache_size", "pretty_output", "trace",
+}
+
+
+def line_comment_start(assembly_language: AssemblyLanguage) -> str:
+    """The characters that start a comment until the end of the line in the GNU assembler for the language."""
+    match assembly_language:
+        case AssemblyLanguage.ARM_32:
+            return "@"
+        case AssemblyLanguage.ARM_64:
+            return "//"
+        case _:
+            return "#"
+
+
+def normalise_submission(source: str, assembly_language: AssemblyLanguage) -> str:
+    """
+    Strips the comments from a submission and collapses its whitespace, leaving string and character literals intact.
+    Submissions that only differ in comments and whitespace outside literals assemble into the same program.
+    """
+    comment_start = line_comment_start(assembly_language)
+    lines = []
+    line = []
+    index = 0
+    while index < len(source):
+        character = source[index]
+        if character == '"':
+            # String literal, up to the closing quote that is not escaped
+            end = index + 1
+            while end < len(source) and source[end] not in '"\n':
+                end += 2 if source[end] == "\\" else 1
+            if source[end:end + 1] == '"':
+                end += 1
+            line.append(source[index:end])
+            index = end
+        elif character == "'":
+            # Character literal, the quote is followed by the (possibly escaped) character
+            end = index + (3 if source[index + 1:index + 2] == "\\" else 2)
+            line.append(source[index:end])
+            index = end
+        elif source.startswith("/*", index):
+            end = source.find("*/", index + 2)
+            line.append(" ")
+            index = len(source) if end == -1 else end + 2
+        elif source.startswith(comment_start, index):
+            end = source.find("\n", index)
+            index = len(source) if end == -1 else end
+        elif character == "\n":
+            lines.append(line)
+            line = []
+            index += 1
+        else:
+            line.append(" " if character.isspace() else character)
+            index += 1
+    lines.append(line)
+
+    normalised_lines = []
+    for line in lines:
+        # Runs of whitespace outside literals are collapsed into a single space
+        normalised_line = []
+        for part in line:
+            if part != " " or (normalised_line and normalised_line[-1] != " "):
+                normalised_line.append(part)
+        normalised_line = "".join(normalised_line).strip(" ")
+        if normalised_line:
+            normalised_lines.append(normalised_line)
+    return "\n".join(normalised_lines)
+
+
+def result_cache_key(config: DodonaConfig, plan: SimpleNamespace) -> str:
+    """
+    Hashes everything the outcome of a judgement depends on: the normalised submission, the plan and its resource
+    files, the test harness template and calling convention trampoline, the options of the judgement and the version
+    of the judge. The calling convention canaries are seeded anew for every run and are not part of the outcome, such
+    that they do not make identical runs look different.
+    """
+    resource_files = sorted({
+        file_name
+        for test in plan.tests
+        for argument in test.arguments if is_buffer_argument(argument)
+        for file_name in (getattr(argument, "buffer", None), getattr(argument, "expected", None)) if file_name
+    })
+    resource_contents = []
+    for file_name in resource_files:
+        try:
+            with open(path.join(config.resources, file_name), "rb") as resource_file:
+                resource_contents.append(resource_file.read())
+        except OSError:
+            resource_contents.append(b"")
+    options = {name: value for name, value in vars(config).items() if name not in RUN_SPECIFIC_OPTIONS}
+    return content_hash((
+        normalise_submission(text_loader(config.source), config.assembly),
+        json.dumps(plan, default=vars, sort_keys=True),
+        *resource_files,
+        *resource_contents,
+        text_loader(template_path(config)),
+        text_loader(calling_convention_trampoline_path(config)),
+        JUDGE_VERSION,
+        json.dumps(options, default=str, sort_keys=True),
+    ))
+
+
+class ResultCache:
+    """
+    Caches the Dodona output of judgements, such that a resubmission of the same code replays the output of the
+    earlier judgement instead of compiling and running the tests again.
+    An entry holds the commands that followed the start of the judgement, one per line, ending with its close.
+    """
+
+    def __init__(self, config: DodonaConfig, plan: SimpleNamespace):
+        self.cache = DiskCache(config.result_cache_dir, config.result_cache_size)
+        self.key = result_cache_key(config, plan)
+        self.translator = config.translator
+
+    def replay(self, judge: SimpleNamespace) -> bool:
+        """Replays the cached judgement, if any, with a message for the staff. Returns whether there was one."""
+        entry_path = self.cache.get(self.key)
+        if entry_path is None:
+            return False
+        try:
+            with open(entry_path) as entry_file:
+                commands = [json.loads(line) for line in entry_file]
+        except (OSError, ValueError):
+            return False
+        if not commands or commands[-1].get("command") != "close-judgement":
+            return False
+
+        result_cache_hit(self.translator)
+        for command in commands[:-1]:
+            command_emitter.emit(command)
+        # The judgement itself is closed as usual
+        vars(judge).update({name: value for name, value in commands[-1].items() if name != "command"})
+        return True
+
+    def start_recording(self):
+        command_emitter.start_recording()
+
+    def store(self, workdir: str):
+        """Stores the commands recorded since start_recording, which must end with the close of the judgement."""
+        entry_path = path.join(workdir, "result-cache-entry.jsonl")
+        with open(entry_path, "w") as entry_file:
+            entry_file.write(command_emitter.stop_recording())
+        self.cache.put(self.key, entry_path)
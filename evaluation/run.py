@@ -1,17 +1,39 @@
-from typing import Optional
-from dodona.dodona_config import DodonaConfig, AssemblyLanguage
+from typing import Optional, Dict, List, Sequence, Union
+from dodona.dodona_config import DodonaConfig, AssemblyLanguage, PerformanceBackend
 from dodona.translator import Translator
-from exceptions.evaluation_exceptions import TestRuntimeError
+from evaluation.profiling import TestPerformance, cachegrind_command, parse_cachegrind_output, callgrind_batch_command, \
+    parse_callgrind_batch_output, qemu_plugin_arguments, parse_qemu_plugin_output, valgrind_ran_out_of_memory, \
+    NativeTiming, parse_native_timing, measures_single_iteration
+from evaluation.process import ProcessResult, ResourceLimits, apply_resource_limits, kill_process_group, run_process
+from exceptions.evaluation_exceptions import TestRuntimeError, TestTimeLimitExceeded, TestMemoryLimitExceeded, \
+    TestOutputLimitExceeded, ValidationError
 from dataclasses import dataclass
 from os import path
+import math
+import os
+import random
+import select
+import signal
 import subprocess
+import time
 
+from utils.tracing import span
 
-@dataclass
-class TestPerformance:
-    instruction_count: int
-    data_read_count: int
-    data_write_count: int
+
+# Record framing of the batch mode of the test program, see templates/main.c.mako
+RECORD_SEPARATOR = "\x1e"
+RECORD_STATUS_COMPLETED = 0
+
+# Exit status of the test program when it exceeded its stack or address space limit, see templates/main.c.mako
+EXIT_MEMORY_LIMIT_EXCEEDED = 3
+# Exit status of the test program when a test of a batch exceeded its own timeout, see templates/main.c.mako
+EXIT_TIME_LIMIT_EXCEEDED = 4
+
+# Address space valgrind and qemu need on top of the memory of the test program itself
+VALGRIND_ADDRESS_SPACE_ALLOWANCE = 2 * 1024 ** 3
+QEMU_ADDRESS_SPACE_ALLOWANCE = 512 * 1024 ** 2
+# qemu-arm reserves the complete 32-bit guest address space up front
+QEMU_ARM_32_ADDRESS_SPACE_ALLOWANCE = 4 * 1024 ** 3 + QEMU_ADDRESS_SPACE_ALLOWANCE
 
 
 @dataclass
@@ -19,6 +41,10 @@ class TestResult:
     generated: str
     performance: Optional[TestPerformance]
     calling_convention_error: Optional[str]
+    # Argument index and offset of the first differing byte of every output buffer that differs from its expected output
+    output_errors: Dict[int, int]
+    # Only with the native performance backend
+    timing: Optional[NativeTiming]
 
 
 def determine_emulator(assembly_language: AssemblyLanguage):
@@ -30,67 +56,317 @@ def determine_emulator(assembly_language: AssemblyLanguage):
             return "qemu-aarch64"
 
 
-def determine_valgrind(assembly_language: AssemblyLanguage):
-    """Determine what Valgrind binary to use for the given assembly language."""
-    match assembly_language:
-        case AssemblyLanguage.ARM_32:
-            return "/opt/valgrind-arm32/bin/valgrind"
-        case AssemblyLanguage.ARM_64:
-            return "/opt/valgrind-aarch64/bin/valgrind"
-        case _:
-            return "valgrind"
+def wrap_in_emulator(command: List[str], config: DodonaConfig, emulator_arguments: Sequence[str] = ()) -> List[str]:
+    """Prefixes the command with the emulator needed for the architecture and its arguments, if any."""
+    emulator = determine_emulator(config.assembly)
+    if emulator:
+        return [emulator, *emulator_arguments, *command]
+    return command
+
+
+def uses_qemu_plugin(config: DodonaConfig) -> bool:
+    return config.measure_performance and config.performance_backend == PerformanceBackend.QEMU_PLUGIN
+
+
+def uses_valgrind(config: DodonaConfig) -> bool:
+    return config.measure_performance and config.performance_backend == PerformanceBackend.VALGRIND
+
+
+def resource_limits(config: DodonaConfig, memory_limit: Optional[int]) -> Optional[ResourceLimits]:
+    """
+    Limits for a run of the test program that may use memory_limit bytes.
+    Valgrind and qemu get an allowance on the address space for their own use. The stack gets a quarter of the limit.
+    """
+    if memory_limit is None:
+        return None
+
+    address_space = memory_limit
+    if uses_valgrind(config):
+        address_space += VALGRIND_ADDRESS_SPACE_ALLOWANCE
+    if config.assembly == AssemblyLanguage.ARM_32:
+        address_space += QEMU_ARM_32_ADDRESS_SPACE_ALLOWANCE
+    elif determine_emulator(config.assembly):
+        address_space += QEMU_ADDRESS_SPACE_ALLOWANCE
+
+    return ResourceLimits(address_space=address_space, stack=memory_limit // 4)
+
+
+def random_magic_seed() -> int:
+    """Seed for the calling convention canary values of the test program."""
+    return random.getrandbits(64)
+
+
+def harness_environment(config: DodonaConfig) -> Dict[str, str]:
+    """Environment for a run of the test program."""
+    return {**os.environ, "MAGIC_SEED": str(random_magic_seed()), "JUDGE_RESOURCES": config.resources}
+
+
+def can_use_fork_server(config: DodonaConfig) -> bool:
+    """Whether the tests can run in a fork server, which is not the case when the runs are measured from outside."""
+    return config.fork_server and not uses_valgrind(config) and not uses_qemu_plugin(config)
+
+
+class ForkServer:
+    """
+    A process of the test program in fork server mode (see templates/main.c.mako), that forks a child for every test it
+    is asked to run. The program and its emulator, if any, are only started and initialised once, while every test
+    still runs in a process of its own. A fork server runs one test at a time, so every worker needs its own.
+    """
+
+    def __init__(self, test_program_path: str, config: DodonaConfig, memory_limit: Optional[int] = None):
+        self.config = config
+        command = wrap_in_emulator([test_program_path, "--fork-server", str(config.output_limit)], config)
+        # The children inherit the limits of the server
+        limits = resource_limits(config, memory_limit)
+        if limits is not None:
+            command = apply_resource_limits(command, limits)
+        self.process = subprocess.Popen(
+            command,
+            cwd=config.workdir,
+            env=harness_environment(config),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+        self.buffer = b""
+
+    def alive(self) -> bool:
+        return self.process.poll() is None
+
+    def _read_line(self, deadline: Optional[float]) -> Optional[str]:
+        """Reads a line from the server, None if the deadline passed first. Raises EOFError if the server is gone."""
+        while b"\n" not in self.buffer:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            readable, _, _ = select.select([self.process.stdout], [], [], remaining)
+            if not readable:
+                return None
+            chunk = os.read(self.process.stdout.fileno(), 4096)
+            if not chunk:
+                raise EOFError("the fork server exited")
+            self.buffer += chunk
+        line, _, self.buffer = self.buffer.partition(b"\n")
+        return line.decode()
+
+    def _read_output(self, file_name: str) -> bytes:
+        """Reads and removes an output file of a test, at most one byte more than the output limit."""
+        file_path = path.join(self.config.workdir, file_name)
+        try:
+            with open(file_path, "rb") as output_file:
+                return output_file.read(self.config.output_limit + 1)
+        except OSError:
+            return b""
+        finally:
+            try:
+                os.unlink(file_path)
+            except OSError:
+                pass
 
+    def run(self, test_id: int, timeout: Optional[float] = None) -> Optional[ProcessResult]:
+        """
+        Runs the test associated with test_id in a forked child, killing it if it takes longer than timeout seconds.
+        Returns None if the fork server itself is gone or does not respond, in which case the test should run in a
+        process of its own, within what is left of the timeout.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        try:
+            self.process.stdin.write(f"{test_id}\n".encode())
+            self.process.stdin.flush()
+            pid = self._read_line(deadline)
+            if pid is None:
+                self.close()
+                return None
+            status = self._read_line(deadline)
+            timed_out = status is None
+            if timed_out:
+                try:
+                    os.kill(int(pid), signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+                status = self._read_line(None)
+        except (OSError, EOFError):
+            self.close()
+            return None
 
-def run_test(translator: Translator, test_program_path: str, test_id: int, config: DodonaConfig):
-    """Runs the test associated with test_id, potentially recording performance metrics."""
+        # Like subprocess, a negative return code is the signal that killed the test
+        kind, _, number = status.partition(" ")
+        returncode = -int(number) if kind == "signal" else int(number)
+        stdout = self._read_output(f"fork-server-{test_id}.stdout")
+        stderr = self._read_output(f"fork-server-{test_id}.stderr")
+        # Writing past the output limit kills the test with SIGXFSZ
+        output_limit_exceeded = returncode == -signal.SIGXFSZ or \
+            max(len(stdout), len(stderr)) > self.config.output_limit
+        return ProcessResult(
+            returncode=returncode,
+            stdout=stdout[:self.config.output_limit].decode(errors="replace"),
+            stderr=stderr[:self.config.output_limit].decode(errors="replace"),
+            timed_out=timed_out,
+            output_limit_exceeded=output_limit_exceeded,
+        )
+
+    def close(self):
+        """Stops the server and the test it may be running."""
+        if self.process.poll() is None:
+            kill_process_group(self.process)
+        self.process.stdin.close()
+        self.process.stdout.close()
+        self.process.wait()
+
+
+def parse_records(stdout: str) -> List[Optional[List[str]]]:
+    """Splits the output of the test program into the fields of its records, None for records that are incomplete."""
+    records = []
+    # Anything before the first separator is not part of a record
+    for record in stdout.split(RECORD_SEPARATOR)[1:]:
+        # A record ends at its newline, anything after it was written by the tested function itself
+        record, newline, _ = record.partition("\n")
+        fields = record.split("\t", 5)
+        if newline and len(fields) == 6 and fields[1] == str(RECORD_STATUS_COMPLETED):
+            records.append(fields)
+        else:
+            records.append(None)
+    return records
+
+
+def record_test_result(fields: List[str], performance: Optional[TestPerformance], config: DodonaConfig) -> TestResult:
+    _, _, generated, output_error, timing, calling_convention_error = fields
+    output_errors = {}
+    for output_buffer_error in output_error.split():
+        index, offset = output_buffer_error.split(":")
+        output_errors[int(index)] = int(offset)
+    return TestResult(
+        generated=generated,
+        performance=performance,
+        calling_convention_error=calling_convention_error if config.check_calling_convention else None,
+        output_errors=output_errors,
+        timing=parse_native_timing(timing)
+    )
+
+
+def run_test(translator: Translator, test_program_path: str, test_id: int, config: DodonaConfig,
+             timeout: Optional[float] = None, memory_limit: Optional[int] = None,
+             fork_server: Optional[ForkServer] = None):
+    """
+    Runs the test associated with test_id, potentially recording performance metrics.
+    If a fork_server is given and the run is not measured from outside, the test runs in a child of the fork server.
+    If the test does not finish within timeout seconds, it is killed and TestTimeLimitExceeded is raised.
+    If the test needs more than memory_limit bytes of memory, TestMemoryLimitExceeded is raised.
+    If the test writes more than config.output_limit bytes to stdout or stderr, TestOutputLimitExceeded is raised.
+    """
     command = [test_program_path, str(test_id)]
 
-    if config.measure_performance:
-        command = [determine_valgrind(config.assembly),
-                   "--tool=cachegrind",
-                   "--cache-sim=yes",
-                   "--log-file=/dev/null",
-                   "--cachegrind-out-file=timing.out",
-                   "--quiet",
-                   *command]
+    # Every test gets its own output file, so tests can run concurrently in the same workdir
+    timing_out_file_name = f"timing-{test_id}.out"
+
+    emulator_arguments = []
+    if uses_qemu_plugin(config):
+        emulator_arguments = qemu_plugin_arguments(config, test_program_path, timing_out_file_name)
+    elif measures_single_iteration(config):
+        # Cachegrind cannot restrict its collection to the measured call
+        command = [*callgrind_batch_command(config, timing_out_file_name), *command]
+    elif uses_valgrind(config):
+        command = [*cachegrind_command(config, timing_out_file_name), *command]
 
     # May need an emulator depending on the architecture
-    emulator = determine_emulator(config.assembly)
-    if emulator:
-        command = [emulator, *command]
-
-    run_result = subprocess.run(
-        command,
-        cwd=config.workdir,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        universal_newlines=True,
-    )
+    command = wrap_in_emulator(command, config, emulator_arguments)
+
+    with span("run_test", test_id=test_id):
+        run_result = None
+        if fork_server is not None and can_use_fork_server(config):
+            start = time.monotonic()
+            run_result = fork_server.run(test_id, timeout)
+            # Without the fork server, the test only gets what is left of its deadline
+            if run_result is None and timeout is not None:
+                timeout = max(0.0, timeout - (time.monotonic() - start))
+        if run_result is None:
+            run_result = run_process(command, config.workdir, harness_environment(config), timeout,
+                                     resource_limits(config, memory_limit), config.output_limit)
 
-    #print(run_result)
+    if run_result.timed_out:
+        raise TestTimeLimitExceeded(translator, 0, -1)
 
-    if run_result.returncode != 0:
+    if run_result.output_limit_exceeded:
+        raise TestOutputLimitExceeded(translator, 0, -1)
+
+    if run_result.returncode == EXIT_MEMORY_LIMIT_EXCEEDED or (
+            uses_valgrind(config) and valgrind_ran_out_of_memory(config.workdir, timing_out_file_name)):
+        raise TestMemoryLimitExceeded(translator, 0, -1)
+
+    records = [record for record in parse_records(run_result.stdout) if record is not None]
+    if run_result.returncode != 0 or not records:
         raise TestRuntimeError(translator, 0, -1)
 
     performance = None
-    if config.measure_performance:
-        target = f"fn={config.tested_function}\n"
-        # Find time measurement line for our tested function
-        with open(path.join(config.workdir, "timing.out")) as cachegrind_out_file:
-            for line in cachegrind_out_file:
-                if line == target:
-                    line = cachegrind_out_file.readline()
-                    # Format: Ir I1mr ILmr Dr D1mr DLmr Dw D1mw DLmw 
-                    parts = line.split(' ')
-                    performance = TestPerformance(
-                        instruction_count=int(parts[1]),
-                        data_read_count=int(parts[4]),
-                        data_write_count=int(parts[7])
-                    )
-                    break
+    with span("parse performance", test_id=test_id):
+        if uses_qemu_plugin(config):
+            _, performance = parse_qemu_plugin_output(path.join(config.workdir, timing_out_file_name))
+        elif measures_single_iteration(config):
+            performances = parse_callgrind_batch_output(config.workdir, timing_out_file_name, config.tested_function)
+            performance = performances[0] if performances else None
+        elif uses_valgrind(config):
+            performance = parse_cachegrind_output(path.join(config.workdir, timing_out_file_name),
+                                                  config.tested_function)
 
-    return TestResult(
-        generated=run_result.stdout,
-        performance=performance,
-        calling_convention_error=run_result.stderr if config.check_calling_convention else None
-    )
+    return record_test_result(records[0], performance, config)
+
+
+def run_test_batch(translator: Translator, test_program_path: str, test_ids: List[int], config: DodonaConfig,
+                   timeout: Optional[float] = None, memory_limit: Optional[int] = None,
+                   test_timeout: Optional[float] = None) -> Dict[int, Union[TestResult, ValidationError]]:
+    """
+    Runs the tests associated with test_ids in a single process of the test program.
+    Only the results of the tests that completed are returned: if the program crashes, the test that crashed and the
+    tests after it are missing from the result. Those should be rerun in isolation using run_test.
+    If a test does not finish within test_timeout seconds, or the batch does not finish within timeout seconds, or the
+    batch produces more than config.output_limit bytes of output, the test that was running gets a
+    TestTimeLimitExceeded or TestOutputLimitExceeded instead of a result. A test that exceeds memory_limit bytes is
+    handled like a crash.
+    When measuring performance, the whole batch runs in one callgrind session that dumps the costs of every test.
+    """
+    test_timeout_milliseconds = max(1, math.ceil(test_timeout * 1000)) if test_timeout is not None else 0
+    command = [test_program_path, "--batch", str(test_timeout_milliseconds), *map(str, test_ids)]
+
+    timing_out_file_name = f"timing-batch-{test_ids[0]}.out"
+    emulator_arguments = []
+    if uses_qemu_plugin(config):
+        emulator_arguments = qemu_plugin_arguments(config, test_program_path, timing_out_file_name)
+    elif uses_valgrind(config):
+        command = [*callgrind_batch_command(config, timing_out_file_name), *command]
+
+    command = wrap_in_emulator(command, config, emulator_arguments)
+
+    with span("run_test_batch", test_ids=test_ids):
+        run_result = run_process(command, config.workdir, harness_environment(config), timeout,
+                                 resource_limits(config, memory_limit), config.output_limit)
+
+    performances = []
+    with span("parse performance", test_ids=test_ids):
+        if uses_qemu_plugin(config):
+            performances, _ = parse_qemu_plugin_output(path.join(config.workdir, timing_out_file_name))
+        elif uses_valgrind(config):
+            performances = parse_callgrind_batch_output(config.workdir, timing_out_file_name, config.tested_function)
+
+    counts_events = uses_qemu_plugin(config) or uses_valgrind(config)
+    results = {}
+    for index, fields in enumerate(parse_records(run_result.stdout)):
+        if fields is None:
+            continue
+        if counts_events and index >= len(performances):
+            # Without its cost the test has to be rerun in isolation
+            continue
+        # The test program dumps the costs of every test right after writing its record
+        performance = performances[index] if counts_events else None
+        results[int(fields[0])] = record_test_result(fields, performance, config)
+
+    timed_out = run_result.timed_out or run_result.returncode == EXIT_TIME_LIMIT_EXCEEDED
+    if timed_out or run_result.output_limit_exceeded:
+        # The tests run in order, so the first one without a result is the one that was running
+        for test_id in test_ids:
+            if test_id not in results:
+                if timed_out:
+                    results[test_id] = TestTimeLimitExceeded(translator, 0, -1)
+                else:
+                    results[test_id] = TestOutputLimitExceeded(translator, 0, -1)
+                break
+
+    return results
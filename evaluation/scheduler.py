@@ -0,0 +1,223 @@
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+from dodona.dodona_config import DodonaConfig
+from dodona.translator import Translator
+from evaluation.profiling import uses_native_timing
+from evaluation.run import ForkServer, TestResult, can_use_fork_server, run_test, run_test_batch
+from exceptions.evaluation_exceptions import ValidationError
+from utils.system import available_cpu_count
+
+
+class TimeBudget:
+    """
+    Splits what is left of the judge's time limit across the tests that still have to run.
+    The budget starts counting when it is created, so it should be created as soon as the judge starts.
+    """
+
+    # Part of the time limit that is kept aside for reporting the results
+    RESERVE = 0.1
+    # Shortest time, in seconds, that a test is still worth starting for
+    MINIMUM_TIMEOUT = 0.05
+
+    def __init__(self, time_limit: float):
+        self.deadline = time.monotonic() + time_limit * (1 - self.RESERVE)
+        self.remaining_tests = 0
+        self.workers = 1
+        self.lock = threading.Lock()
+
+    def start(self, test_count: int, workers: int):
+        """Starts splitting the budget across test_count tests, of which up to workers run concurrently."""
+        with self.lock:
+            self.remaining_tests = test_count
+            self.workers = workers
+
+    def timeout(self, test_count: int) -> float:
+        """The time a run of test_count of the remaining tests may take."""
+        with self.lock:
+            remaining_time = self.deadline - time.monotonic()
+            share = test_count * self.workers / max(1, self.remaining_tests)
+        return max(0.0, remaining_time * min(1.0, share))
+
+    def exhausted(self) -> bool:
+        """Whether the time limit is used up, such that the next test cannot get a meaningful share of it."""
+        return self.timeout(1) < self.MINIMUM_TIMEOUT
+
+    def consume(self, test_count: int):
+        """Marks test_count tests as done."""
+        with self.lock:
+            self.remaining_tests = max(0, self.remaining_tests - test_count)
+
+
+class TestScheduler:
+    """
+    Decides when and how the tests of a plan are executed.
+    Results are always handed out per test, so the caller can report them in plan order, regardless of the order in
+    which the tests actually ran. Every run gets a deadline from the time budget, and a fixed share of the memory
+    limit. Every test of a batch also gets its own deadline, the share it would get if it ran on its own.
+    If needs_measurement is given and performance is measured, the tests run in two phases: first without measuring,
+    after which only the tests for which needs_measurement holds run again to measure their performance.
+    Tests that run in a process of their own are forked from a fork server per worker, if the config asks for it.
+    """
+
+    # Part of the memory limit that is available to every test, the rest is left for the judge itself
+    TEST_MEMORY_SHARE = 0.75
+
+    def __init__(self, translator: Translator, test_program_path: str, config: DodonaConfig, test_ids: Iterable[int],
+                 time_budget: TimeBudget, needs_measurement: Optional[Callable[[int, TestResult], bool]] = None):
+        self.translator = translator
+        self.test_program_path = test_program_path
+        self.config = config
+        self.time_budget = time_budget
+        self.needs_measurement = needs_measurement
+        # Configuration of the first phase, the same as config if there is only one phase
+        self.run_config = config
+        # Native timing is cheap enough to happen in the first phase
+        if needs_measurement is not None and config.measure_performance and not uses_native_timing(config):
+            self.run_config = DodonaConfig(**{**vars(config), "measure_performance": False})
+        self.executor: Optional[ThreadPoolExecutor] = None
+        # Work that was scheduled but whose result was not handed out yet
+        self.pending: Dict[int, Callable[[], TestResult]] = {}
+        self.pending_batches: List[Tuple[List[int], Callable[[], Dict[int, TestResult]]]] = []
+        self.results: Dict[int, Union[TestResult, ValidationError]] = {}
+        # Every worker thread gets its own fork server when it first needs one
+        self.local = threading.local()
+        self.fork_servers: List[ForkServer] = []
+        self.fork_servers_lock = threading.Lock()
+
+        test_ids = list(test_ids)
+        workers = 1
+        if config.parallel_tests:
+            workers = available_cpu_count()
+            # Each test is a separate process, so threads suffice to keep the worker processes busy
+            self.executor = ThreadPoolExecutor(max_workers=workers)
+        time_budget.start(len(test_ids), workers)
+        # The limit does not depend on the number of workers, such that a test gets the same verdict on every machine
+        self.memory_limit = int(config.memory_limit * self.TEST_MEMORY_SHARE)
+
+        if config.batch_tests:
+            # One batch per worker
+            batch_size = max(1, math.ceil(len(test_ids) / workers))
+            for start in range(0, len(test_ids), batch_size):
+                batch = test_ids[start:start + batch_size]
+                self.pending_batches.append((batch, self._schedule(self._run_test_batch, batch)))
+        elif self.executor is not None:
+            for test_id in test_ids:
+                self.pending[test_id] = self._schedule(self._run_test, test_id)
+
+    def _schedule(self, function: Callable, *args) -> Callable:
+        """Schedules function(*args) and returns a callable that waits for its result."""
+        if self.executor is not None:
+            return self.executor.submit(function, *args).result
+        # Without a worker pool the work is only done once its result is needed
+        return partial(function, *args)
+
+    def _two_phases(self) -> bool:
+        return self.run_config is not self.config
+
+    def _fork_server(self) -> Optional[ForkServer]:
+        """The fork server of the current worker, started anew if it is not running anymore."""
+        if not can_use_fork_server(self.run_config):
+            return None
+        fork_server = getattr(self.local, "fork_server", None)
+        if fork_server is None or not fork_server.alive():
+            fork_server = ForkServer(self.test_program_path, self.run_config, self.memory_limit)
+            self.local.fork_server = fork_server
+            with self.fork_servers_lock:
+                self.fork_servers.append(fork_server)
+        return fork_server
+
+    def _measure(self, test_id: int, result: TestResult):
+        """Runs the test again to measure its performance."""
+        measured_result = run_test(self.translator, self.test_program_path, test_id, self.config,
+                                   self.time_budget.timeout(1), self.memory_limit)
+        result.performance = measured_result.performance
+
+    def _run_test(self, test_id: int) -> TestResult:
+        try:
+            result = run_test(self.translator, self.test_program_path, test_id, self.run_config,
+                              self.time_budget.timeout(1), self.memory_limit, self._fork_server())
+            if self._two_phases() and self.needs_measurement(test_id, result):
+                self._measure(test_id, result)
+            return result
+        finally:
+            self.time_budget.consume(1)
+
+    def _run_test_batch(self, batch: List[int]) -> Dict[int, Union[TestResult, ValidationError]]:
+        results = run_test_batch(self.translator, self.test_program_path, batch, self.run_config,
+                                 self.time_budget.timeout(len(batch)), self.memory_limit, self.time_budget.timeout(1))
+        if self._two_phases():
+            self._measure_batch(results)
+        self.time_budget.consume(len(results))
+        return results
+
+    def _measure_batch(self, results: Dict[int, Union[TestResult, ValidationError]]):
+        """Measures the performance of the tests of a batch that need it, again in a single process."""
+        measured_test_ids = [test_id for test_id, result in results.items()
+                             if isinstance(result, TestResult) and self.needs_measurement(test_id, result)]
+        if not measured_test_ids:
+            return
+
+        measured_results = run_test_batch(self.translator, self.test_program_path, measured_test_ids, self.config,
+                                          self.time_budget.timeout(len(measured_test_ids)), self.memory_limit,
+                                          self.time_budget.timeout(1))
+        for test_id in measured_test_ids:
+            measured_result = measured_results.get(test_id)
+            if isinstance(measured_result, TestResult):
+                results[test_id].performance = measured_result.performance
+            elif measured_result is not None:
+                results[test_id] = measured_result
+            else:
+                # The measured batch did not get to this test, it is measured in isolation instead
+                try:
+                    self._measure(test_id, results[test_id])
+                except ValidationError as e:
+                    results[test_id] = e
+
+    def _collect_batch(self, test_id: int):
+        """Waits for the batch containing test_id and schedules the tests it did not complete in isolation."""
+        for index, (batch, batch_results) in enumerate(self.pending_batches):
+            if test_id in batch:
+                del self.pending_batches[index]
+                completed = batch_results()
+                self.results.update(completed)
+                for missing_test_id in batch:
+                    if missing_test_id not in completed:
+                        self.pending[missing_test_id] = self._schedule(self._run_test, missing_test_id)
+                return
+
+    def result(self, test_id: int) -> TestResult:
+        """
+        Returns the result of the test associated with test_id, running it first if that has not happened yet.
+        Raises the TestRuntimeError, TestTimeLimitExceeded or TestLimitExceeded of the test, if any.
+        """
+        self._collect_batch(test_id)
+        if test_id in self.results:
+            result = self.results.pop(test_id)
+            if isinstance(result, ValidationError):
+                raise result
+            return result
+
+        pending = self.pending.pop(test_id, None)
+        if pending is not None:
+            return pending()
+        return self._run_test(test_id)
+
+    def close(self):
+        """Cancels the tests that were not started yet, waits for the running ones and stops the fork servers."""
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+        for fork_server in self.fork_servers:
+            fork_server.close()
+        self.fork_servers = []
+
+    def __enter__(self) -> "TestScheduler":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
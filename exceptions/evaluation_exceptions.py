@@ -23,3 +23,33 @@ class TestRuntimeError(ValidationError):
     def __init__(self, trans: Translator, line: int, pos: int):
         msg = trans.human_error(ErrorType.RUNTIME_ERROR)
         super(TestRuntimeError, self).__init__(trans=trans, msg=msg, line=line, pos=pos)
+
+
+class TestTimeLimitExceeded(ValidationError):
+    """Exception that indicates that the test did not finish within its share of the time limit"""
+
+    def __init__(self, trans: Translator, line: int, pos: int):
+        msg = trans.human_error(ErrorType.TIME_LIMIT_EXCEEDED)
+        super(TestTimeLimitExceeded, self).__init__(trans=trans, msg=msg, line=line, pos=pos)
+
+
+class TestLimitExceeded(ValidationError):
+    """Base class for exceptions that indicate that the test exceeded one of its limits"""
+
+    error_type: ErrorType
+
+    def __init__(self, trans: Translator, line: int, pos: int):
+        msg = trans.human_error(self.error_type)
+        super(TestLimitExceeded, self).__init__(trans=trans, msg=msg, line=line, pos=pos)
+
+
+class TestMemoryLimitExceeded(TestLimitExceeded):
+    """Exception that indicates that the test ran out of memory or stack space"""
+
+    error_type = ErrorType.MEMORY_LIMIT_EXCEEDED
+
+
+class TestOutputLimitExceeded(TestLimitExceeded):
+    """Exception that indicates that the test produced more output than allowed"""
+
+    error_type = ErrorType.OUTPUT_LIMIT_EXCEEDED
@@ -0,0 +1,155 @@
+"""
+Judge server: keeps a warm interpreter with the judge's modules and the harness template loaded, and runs a judgement
+for every connection on a Unix socket.
+
+Usage: python judge_server.py serve SOCKET
+       python judge_server.py judge SOCKET < config.json
+
+A client sends the run configuration (JSON, the same as the judge reads from stdin) and shuts down its side of the
+connection. The server forks a child for the judgement, which streams the Dodona output back over the connection and
+closes it. Every judgement runs in its own process, with its own workdir and configuration, like a regular run.
+At most ASSEMBLY_JUDGE_SERVER_MAX_JUDGEMENTS judgements (by default one per available CPU) run at the same time, further
+connections wait until one of them finishes. The client exits with status 1 if the output ends without closing the
+judgement, e.g. because the judgement crashed.
+The socket is only accessible to the account that runs the server.
+"""
+
+import io
+import json
+import os
+import socket
+import stat
+import sys
+from os import path
+from types import SimpleNamespace
+from typing import TextIO
+
+import assembly_judge
+from dodona.dodona_command import command_emitter
+from evaluation.compilation import load_template, template_module_directory, template_path
+from utils.system import available_cpu_count
+from utils.tracing import finish_tracing
+
+JUDGE_DIRECTORY = path.dirname(path.realpath(__file__))
+READ_CHUNK_SIZE = 64 * 1024
+# Marks the end of a complete judgement in the Dodona output
+CLOSE_JUDGEMENT = b'"close-judgement"'
+
+
+def warm_up():
+    """Loads what every judgement needs up front, such that the forked children inherit it."""
+    config = SimpleNamespace(judge=JUDGE_DIRECTORY, harness_cache_dir=os.environ.get("ASSEMBLY_JUDGE_CACHE_DIR"))
+    load_template(template_path(config), template_module_directory(config))
+
+
+def receive_config(connection: socket.socket) -> str:
+    chunks = []
+    while True:
+        chunk = connection.recv(READ_CHUNK_SIZE)
+        if not chunk:
+            return b"".join(chunks).decode("utf-8")
+        chunks.append(chunk)
+
+
+def run_judgement(raw_config: str, output: TextIO):
+    """Runs the judgement of a run configuration, writing the Dodona output to output. Only for forked children."""
+    sys.stdin = io.StringIO(raw_config)
+    sys.stdout = output
+    command_emitter.stream = output
+    # The judge expects to run in the workdir
+    os.chdir(json.loads(raw_config)["workdir"])
+    assembly_judge.main()
+
+
+def exit_judgement(exit_status: int):
+    """Ends a forked child after its judgement."""
+    # Only the judge's own exit work is done here: the exit handlers of the parent, such as the cleanup of its
+    # temporary directories, must not run in the child
+    command_emitter.flush()
+    finish_tracing()
+    sys.stdout.flush()
+    os._exit(exit_status)
+
+
+def serve(socket_path: str):
+    warm_up()
+
+    if path.lexists(socket_path):
+        # A stale socket of an earlier server is replaced, anything else is left alone
+        if not stat.S_ISSOCK(os.lstat(socket_path).st_mode):
+            sys.exit(f"{socket_path} exists and is not a socket")
+        os.unlink(socket_path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    # Only the owner may connect, as the judgements run in the account of the server
+    umask = os.umask(0o177)
+    try:
+        server.bind(socket_path)
+    finally:
+        os.umask(umask)
+    server.listen()
+    max_judgements = int(os.environ.get("ASSEMBLY_JUDGE_SERVER_MAX_JUDGEMENTS", available_cpu_count()))
+    running = set()
+
+    while True:
+        # Reap the finished judgements, and wait for one to finish if too many are running
+        while running:
+            pid, _ = os.waitpid(-1, 0 if len(running) >= max_judgements else os.WNOHANG)
+            if pid == 0:
+                break
+            running.discard(pid)
+
+        connection, _ = server.accept()
+        pid = os.fork()
+        if pid == 0:
+            server.close()
+            exit_status = 0
+            try:
+                run_judgement(receive_config(connection), connection.makefile("w", encoding="utf-8"))
+            except Exception:
+                exit_status = 1
+                sys.excepthook(*sys.exc_info())
+            finally:
+                exit_judgement(exit_status)
+        running.add(pid)
+        connection.close()
+
+
+def request(socket_path: str):
+    """
+    Sends the configuration on stdin to the server and copies the Dodona output to stdout.
+    Exits with status 1 if the output does not close the judgement.
+    """
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.connect(socket_path)
+    client.sendall(sys.stdin.buffer.read())
+    client.shutdown(socket.SHUT_WR)
+    closed = False
+    # The end of the previous chunk, in case the marker is split across chunks
+    tail = b""
+    while True:
+        chunk = client.recv(READ_CHUNK_SIZE)
+        if not chunk:
+            break
+        sys.stdout.buffer.write(chunk)
+        closed = closed or CLOSE_JUDGEMENT in tail + chunk
+        tail = chunk[-len(CLOSE_JUDGEMENT):]
+    sys.stdout.flush()
+    client.close()
+    if not closed:
+        print("the judgement ended without closing", file=sys.stderr)
+        sys.exit(1)
+
+
+def main():
+    if len(sys.argv) != 3 or sys.argv[1] not in ("serve", "judge"):
+        print(__doc__.strip(), file=sys.stderr)
+        sys.exit(2)
+
+    if sys.argv[1] == "serve":
+        serve(sys.argv[2])
+    else:
+        request(sys.argv[2])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+/*
+ * QEMU TCG plugin that counts the instructions, loads and stores executed inside one function of the guest program.
+ *
+ * Arguments (all addresses in hexadecimal):
+ *   start=<address>   first address of the measured function
+ *   end=<address>     first address after the measured function
+ *   marker=<address>  optional, entry of a function that marks the end of a test: the counters are written out and
+ *                     reset every time it is executed
+ *   outfile=<path>    file to write the counters to
+ *
+ * Output: one line "test <instructions> <loads> <stores>" per execution of the marker, followed by one line
+ * "exit <instructions> <loads> <stores>" with the counters since the last marker when the program exits.
+ */
+
+#include <inttypes.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+
+#include <qemu-plugin.h>
+
+QEMU_PLUGIN_EXPORT int qemu_plugin_version = QEMU_PLUGIN_VERSION;
+
+static uint64_t range_start;
+static uint64_t range_end;
+static uint64_t marker;
+static int has_marker;
+static FILE *out_file;
+
+static uint64_t instruction_count;
+static uint64_t load_count;
+static uint64_t store_count;
+
+static void write_counters(const char *kind) {
+    fprintf(out_file, "%s %" PRIu64 " %" PRIu64 " %" PRIu64 "\n", kind, instruction_count, load_count, store_count);
+    fflush(out_file);
+    instruction_count = 0;
+    load_count = 0;
+    store_count = 0;
+}
+
+static int is_key(const char *argument, size_t key_length, const char *key) {
+    return key_length == strlen(key) && strncmp(argument, key, key_length) == 0;
+}
+
+static void on_instruction(unsigned int vcpu_index, void *userdata) {
+    ++instruction_count;
+}
+
+static void on_memory_access(unsigned int vcpu_index, qemu_plugin_meminfo_t info, uint64_t vaddr, void *userdata) {
+    if (qemu_plugin_mem_is_store(info)) {
+        ++store_count;
+    } else {
+        ++load_count;
+    }
+}
+
+static void on_marker(unsigned int vcpu_index, void *userdata) {
+    write_counters("test");
+}
+
+static void on_translation(qemu_plugin_id_t id, struct qemu_plugin_tb *tb) {
+    size_t instructions = qemu_plugin_tb_n_insns(tb);
+    for (size_t i = 0; i < instructions; ++i) {
+        struct qemu_plugin_insn *insn = qemu_plugin_tb_get_insn(tb, i);
+        uint64_t address = qemu_plugin_insn_vaddr(insn);
+        if (address >= range_start && address < range_end) {
+            qemu_plugin_register_vcpu_insn_exec_cb(insn, on_instruction, QEMU_PLUGIN_CB_NO_REGS, NULL);
+            qemu_plugin_register_vcpu_mem_cb(insn, on_memory_access, QEMU_PLUGIN_CB_NO_REGS, QEMU_PLUGIN_MEM_RW, NULL);
+        }
+        if (has_marker && address == marker) {
+            qemu_plugin_register_vcpu_insn_exec_cb(insn, on_marker, QEMU_PLUGIN_CB_NO_REGS, NULL);
+        }
+    }
+}
+
+static void on_program_exit(qemu_plugin_id_t id, void *userdata) {
+    write_counters("exit");
+    fclose(out_file);
+}
+
+QEMU_PLUGIN_EXPORT int qemu_plugin_install(qemu_plugin_id_t id, const qemu_info_t *info, int argc, char **argv) {
+    const char *out_file_path = NULL;
+
+    for (int i = 0; i < argc; ++i) {
+        char *value = strchr(argv[i], '=');
+        if (value == NULL) {
+            fprintf(stderr, "function_counter: malformed argument %s\n", argv[i]);
+            return -1;
+        }
+        size_t key_length = (size_t) (value - argv[i]);
+        ++value;
+        if (is_key(argv[i], key_length, "start")) {
+            range_start = strtoull(value, NULL, 16);
+        } else if (is_key(argv[i], key_length, "end")) {
+            range_end = strtoull(value, NULL, 16);
+        } else if (is_key(argv[i], key_length, "marker")) {
+            marker = strtoull(value, NULL, 16);
+            has_marker = 1;
+        } else if (is_key(argv[i], key_length, "outfile")) {
+            out_file_path = value;
+        } else {
+            fprintf(stderr, "function_counter: unknown argument %s\n", argv[i]);
+            return -1;
+        }
+    }
+
+    if (out_file_path == NULL || range_end <= range_start) {
+        fprintf(stderr, "function_counter: start, end and outfile are required\n");
+        return -1;
+    }
+
+    out_file = fopen(out_file_path, "w");
+    if (out_file == NULL) {
+        perror("function_counter");
+        return -1;
+    }
+
+    qemu_plugin_register_vcpu_tb_trans_cb(id, on_translation);
+    qemu_plugin_register_atexit_cb(id, on_program_exit, NULL);
+    return 0;
+}
@@ -0,0 +1,62 @@
+@ Calling convention trampoline for ARM (AAPCS), see templates/main.c.mako
+@
+@ Called like the tested function, with judge_cc_target pointing to it. Loads the callee-saved registers with the
+@ canary values in judge_cc_magic, calls the target and sets bit i of judge_cc_clobbered if register r(4 + i) was not
+@ restored. The harness's own registers and return address are kept in judge_cc_saved instead of on the stack, such
+@ that the target gets the stack arguments where it expects them.
+@ Written in unified syntax with IT blocks, such that it assembles in the ARM and the Thumb state of the harness.
+    .pushsection .text
+    .syntax unified
+    .p2align 2
+    .globl judge_cc_trampoline
+    .type judge_cc_trampoline, %function
+judge_cc_trampoline:
+    ldr ip, =judge_cc_saved
+    stm ip, {r4-r11, lr}
+    ldr ip, =judge_cc_magic
+    ldm ip, {r4-r11}
+    ldr ip, =judge_cc_target
+    ldr ip, [ip]
+    blx ip
+    ldr ip, =judge_cc_magic
+    mov r1, #0
+    ldr r2, [ip, #0]
+    cmp r4, r2
+    it ne
+    orrne r1, r1, #1
+    ldr r2, [ip, #4]
+    cmp r5, r2
+    it ne
+    orrne r1, r1, #2
+    ldr r2, [ip, #8]
+    cmp r6, r2
+    it ne
+    orrne r1, r1, #4
+    ldr r2, [ip, #12]
+    cmp r7, r2
+    it ne
+    orrne r1, r1, #8
+    ldr r2, [ip, #16]
+    cmp r8, r2
+    it ne
+    orrne r1, r1, #16
+    ldr r2, [ip, #20]
+    cmp r9, r2
+    it ne
+    orrne r1, r1, #32
+    ldr r2, [ip, #24]
+    cmp r10, r2
+    it ne
+    orrne r1, r1, #64
+    ldr r2, [ip, #28]
+    cmp r11, r2
+    it ne
+    orrne r1, r1, #128
+    ldr ip, =judge_cc_clobbered
+    str r1, [ip]
+    ldr ip, =judge_cc_saved
+    ldm ip, {r4-r11, lr}
+    bx lr
+    .ltorg
+    .size judge_cc_trampoline, .-judge_cc_trampoline
+    .popsection
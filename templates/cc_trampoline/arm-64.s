@@ -0,0 +1,90 @@
+// Calling convention trampoline for AArch64 (AAPCS64), see templates/main.c.mako
+//
+// Called like the tested function, with judge_cc_target pointing to it. Loads the callee-saved registers with the
+// canary values in judge_cc_magic, calls the target and sets bit i of judge_cc_clobbered if register x(19 + i) was not
+// restored. The harness's own registers and return address are kept in judge_cc_saved instead of on the stack, such
+// that the target gets the stack arguments where it expects them.
+    .pushsection .text
+    .p2align 2
+    .globl judge_cc_trampoline
+    .type judge_cc_trampoline, %function
+judge_cc_trampoline:
+    adrp x16, judge_cc_saved
+    add x16, x16, :lo12:judge_cc_saved
+    stp x19, x20, [x16, #0]
+    stp x21, x22, [x16, #16]
+    stp x23, x24, [x16, #32]
+    stp x25, x26, [x16, #48]
+    stp x27, x28, [x16, #64]
+    stp x29, x30, [x16, #80]
+    adrp x17, judge_cc_magic
+    add x17, x17, :lo12:judge_cc_magic
+    ldp x19, x20, [x17, #0]
+    ldp x21, x22, [x17, #16]
+    ldp x23, x24, [x17, #32]
+    ldp x25, x26, [x17, #48]
+    ldp x27, x28, [x17, #64]
+    ldr x29, [x17, #80]
+    adrp x16, judge_cc_target
+    ldr x16, [x16, :lo12:judge_cc_target]
+    blr x16
+    adrp x17, judge_cc_magic
+    add x17, x17, :lo12:judge_cc_magic
+    mov w9, #0
+    ldr x10, [x17, #0]
+    cmp x19, x10
+    cset w11, ne
+    orr w9, w9, w11, lsl #0
+    ldr x10, [x17, #8]
+    cmp x20, x10
+    cset w11, ne
+    orr w9, w9, w11, lsl #1
+    ldr x10, [x17, #16]
+    cmp x21, x10
+    cset w11, ne
+    orr w9, w9, w11, lsl #2
+    ldr x10, [x17, #24]
+    cmp x22, x10
+    cset w11, ne
+    orr w9, w9, w11, lsl #3
+    ldr x10, [x17, #32]
+    cmp x23, x10
+    cset w11, ne
+    orr w9, w9, w11, lsl #4
+    ldr x10, [x17, #40]
+    cmp x24, x10
+    cset w11, ne
+    orr w9, w9, w11, lsl #5
+    ldr x10, [x17, #48]
+    cmp x25, x10
+    cset w11, ne
+    orr w9, w9, w11, lsl #6
+    ldr x10, [x17, #56]
+    cmp x26, x10
+    cset w11, ne
+    orr w9, w9, w11, lsl #7
+    ldr x10, [x17, #64]
+    cmp x27, x10
+    cset w11, ne
+    orr w9, w9, w11, lsl #8
+    ldr x10, [x17, #72]
+    cmp x28, x10
+    cset w11, ne
+    orr w9, w9, w11, lsl #9
+    ldr x10, [x17, #80]
+    cmp x29, x10
+    cset w11, ne
+    orr w9, w9, w11, lsl #10
+    adrp x16, judge_cc_clobbered
+    str w9, [x16, :lo12:judge_cc_clobbered]
+    adrp x16, judge_cc_saved
+    add x16, x16, :lo12:judge_cc_saved
+    ldp x19, x20, [x16, #0]
+    ldp x21, x22, [x16, #16]
+    ldp x23, x24, [x16, #32]
+    ldp x25, x26, [x16, #48]
+    ldp x27, x28, [x16, #64]
+    ldp x29, x30, [x16, #80]
+    ret
+    .size judge_cc_trampoline, .-judge_cc_trampoline
+    .popsection
@@ -0,0 +1,49 @@
+# Calling convention trampoline for x86-32 (cdecl), see templates/main.c.mako
+#
+# Called like the tested function, with judge_cc_target pointing to it. Loads the callee-saved registers with the
+# canary values in judge_cc_magic, calls the target and sets bit i of judge_cc_clobbered if register i was not restored:
+# ebx, esi, edi, ebp. The harness's own registers and return address are kept in judge_cc_saved instead of on the
+# stack, such that the target gets its arguments where it expects them.
+    .pushsection .text
+    .globl judge_cc_trampoline
+    .type judge_cc_trampoline, @function
+judge_cc_trampoline:
+    popl judge_cc_saved+16
+    movl %ebx, judge_cc_saved+0
+    movl %esi, judge_cc_saved+4
+    movl %edi, judge_cc_saved+8
+    movl %ebp, judge_cc_saved+12
+    movl judge_cc_magic+0, %ebx
+    movl judge_cc_magic+4, %esi
+    movl judge_cc_magic+8, %edi
+    movl judge_cc_magic+12, %ebp
+    call *judge_cc_target
+    xorl %ecx, %ecx
+    xorl %edx, %edx
+    cmpl judge_cc_magic+0, %ebx
+    setne %dl
+    orl %edx, %ecx
+    xorl %edx, %edx
+    cmpl judge_cc_magic+4, %esi
+    setne %dl
+    shll $1, %edx
+    orl %edx, %ecx
+    xorl %edx, %edx
+    cmpl judge_cc_magic+8, %edi
+    setne %dl
+    shll $2, %edx
+    orl %edx, %ecx
+    xorl %edx, %edx
+    cmpl judge_cc_magic+12, %ebp
+    setne %dl
+    shll $3, %edx
+    orl %edx, %ecx
+    movl %ecx, judge_cc_clobbered
+    movl judge_cc_saved+0, %ebx
+    movl judge_cc_saved+4, %esi
+    movl judge_cc_saved+8, %edi
+    movl judge_cc_saved+12, %ebp
+    pushl judge_cc_saved+16
+    ret
+    .size judge_cc_trampoline, .-judge_cc_trampoline
+    .popsection
@@ -0,0 +1,65 @@
+# Calling convention trampoline for x86-64 (System V), see templates/main.c.mako
+#
+# Called like the tested function, with judge_cc_target pointing to it. Loads the callee-saved registers with the
+# canary values in judge_cc_magic, calls the target and sets bit i of judge_cc_clobbered if register i was not restored:
+# rbx, r12, r13, r14, r15, rbp. The harness's own registers and return address are kept in judge_cc_saved instead of on
+# the stack, such that the target gets the stack arguments where it expects them.
+    .pushsection .text
+    .globl judge_cc_trampoline
+    .type judge_cc_trampoline, @function
+judge_cc_trampoline:
+    popq judge_cc_saved+48(%rip)
+    movq %rbx, judge_cc_saved+0(%rip)
+    movq %r12, judge_cc_saved+8(%rip)
+    movq %r13, judge_cc_saved+16(%rip)
+    movq %r14, judge_cc_saved+24(%rip)
+    movq %r15, judge_cc_saved+32(%rip)
+    movq %rbp, judge_cc_saved+40(%rip)
+    movq judge_cc_magic+0(%rip), %rbx
+    movq judge_cc_magic+8(%rip), %r12
+    movq judge_cc_magic+16(%rip), %r13
+    movq judge_cc_magic+24(%rip), %r14
+    movq judge_cc_magic+32(%rip), %r15
+    movq judge_cc_magic+40(%rip), %rbp
+    call *judge_cc_target(%rip)
+    xorl %r11d, %r11d
+    xorl %r10d, %r10d
+    cmpq judge_cc_magic+0(%rip), %rbx
+    setne %r10b
+    orl %r10d, %r11d
+    xorl %r10d, %r10d
+    cmpq judge_cc_magic+8(%rip), %r12
+    setne %r10b
+    shll $1, %r10d
+    orl %r10d, %r11d
+    xorl %r10d, %r10d
+    cmpq judge_cc_magic+16(%rip), %r13
+    setne %r10b
+    shll $2, %r10d
+    orl %r10d, %r11d
+    xorl %r10d, %r10d
+    cmpq judge_cc_magic+24(%rip), %r14
+    setne %r10b
+    shll $3, %r10d
+    orl %r10d, %r11d
+    xorl %r10d, %r10d
+    cmpq judge_cc_magic+32(%rip), %r15
+    setne %r10b
+    shll $4, %r10d
+    orl %r10d, %r11d
+    xorl %r10d, %r10d
+    cmpq judge_cc_magic+40(%rip), %rbp
+    setne %r10b
+    shll $5, %r10d
+    orl %r10d, %r11d
+    movl %r11d, judge_cc_clobbered(%rip)
+    movq judge_cc_saved+0(%rip), %rbx
+    movq judge_cc_saved+8(%rip), %r12
+    movq judge_cc_saved+16(%rip), %r13
+    movq judge_cc_saved+24(%rip), %r14
+    movq judge_cc_saved+32(%rip), %r15
+    movq judge_cc_saved+40(%rip), %rbp
+    pushq judge_cc_saved+48(%rip)
+    ret
+    .size judge_cc_trampoline, .-judge_cc_trampoline
+    .popsection
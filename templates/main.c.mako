@@ -1,255 +1,650 @@
+#define _XOPEN_SOURCE 700
+#define _DEFAULT_SOURCE
+
+#include <errno.h>
+#include <fcntl.h>
+#include <signal.h>
+#include <stdarg.h>
 #include <stdio.h>
 #include <stdint.h>
 #include <stdlib.h>
+#include <string.h>
+#include <sys/mman.h>
+#include <sys/resource.h>
+#include <sys/stat.h>
+#include <sys/time.h>
+#include <sys/wait.h>
+#include <time.h>
+#include <unistd.h>
 
-#define OPTIMIZER_HIDE_VAR(var) __asm__ __volatile__("" : "=r" (var) : "0" (var))
 #define OPTIMIZER_BARRIER() __asm__ __volatile__("" ::: "memory", "cc")
 
 extern int ${tested_function}(${', '.join(tested_arguments)});
 
+% if measure_single_iteration:
+    /*
+     * Only the last iteration of a test is measured, through judge_measured_call(): callgrind collects costs only while
+     * it runs (--toggle-collect). If the callgrind client requests are available, the other iterations also run without
+     * instrumentation. Outside valgrind, the client requests do nothing.
+     */
+    #if __has_include(<valgrind/callgrind.h>)
+        #include <valgrind/callgrind.h>
+        #define START_INSTRUMENTATION() CALLGRIND_START_INSTRUMENTATION
+        #define STOP_INSTRUMENTATION() CALLGRIND_STOP_INSTRUMENTATION
+    #else
+        #define START_INSTRUMENTATION() ((void) 0)
+        #define STOP_INSTRUMENTATION() ((void) 0)
+    #endif
+
+    __attribute__((noinline)) int judge_measured_call(${', '.join(f"{argument_type} argument_{index}" for index, argument_type in enumerate(tested_arguments)) or "void"}) {
+        int result = ${tested_function}(${', '.join(f"argument_{index}" for index in range(len(tested_arguments)))});
+        /* No tail call, such that the call stays within judge_measured_call */
+        OPTIMIZER_BARRIER();
+        return result;
+    }
+% endif
+
 %if check_calling_convention:
-    #define MAGIC_0 ${random_magic_number_generator()}L
-    #define MAGIC_1 ${random_magic_number_generator()}L
-    #define MAGIC_2 ${random_magic_number_generator()}L
-    #define MAGIC_3 ${random_magic_number_generator()}L
-    #define MAGIC_4 ${random_magic_number_generator()}L
-    #define MAGIC_5 ${random_magic_number_generator()}L
-    #define MAGIC_6 ${random_magic_number_generator()}L
-    #define MAGIC_7 ${random_magic_number_generator()}L
-    #define MAGIC_8 ${random_magic_number_generator()}L
-    #define MAGIC_9 ${random_magic_number_generator()}L
-    #define MAGIC_10 ${random_magic_number_generator()}L
+    /*
+     * The calling convention is checked by a trampoline in assembly (see templates/cc_trampoline), which is called like
+     * the tested function. It loads the callee-saved registers with the canary values in judge_cc_magic, calls
+     * judge_cc_target and sets a bit in judge_cc_clobbered for every callee-saved register that was not restored.
+     */
+    extern int judge_cc_trampoline(${', '.join(tested_arguments)});
+    long judge_cc_magic[11];
+    void *judge_cc_target;
+    long judge_cc_saved[12];
+    unsigned judge_cc_clobbered;
+
+    __asm__(
+    % for line in calling_convention_trampoline.splitlines():
+        ${c_string(line + "\n")}
+    % endfor
+    );
+
+    /* Names of the callee-saved registers, in the order of the bits of judge_cc_clobbered */
+    #if defined(__x86_64__)
+        static const char *const callee_saved_registers[] = { "rbx", "r12", "r13", "r14", "r15", "rbp" };
+    #elif defined(__i386__)
+        static const char *const callee_saved_registers[] = { "ebx", "esi", "edi", "ebp" };
+    #elif defined(__arm__)
+        static const char *const callee_saved_registers[] = { "r4", "r5", "r6", "r7", "r8", "r9", "r10", "r11" };
+    #elif defined(__aarch64__)
+        static const char *const callee_saved_registers[] = {
+            "x19", "x20", "x21", "x22", "x23", "x24", "x25", "x26", "x27", "x28", "x29"
+        };
+    #endif
+
+    /*
+     * The canary values are derived at run time from the MAGIC_SEED environment variable (using splitmix64), such that
+     * the compiled harness does not depend on them and a submission cannot hardcode them.
+     */
+    static void seed_magic_numbers(void) {
+        const char *seed = getenv("MAGIC_SEED");
+        uint64_t state = seed ? strtoull(seed, NULL, 10) : 0;
+        for (int i = 0; i < 11; ++i) {
+            uint64_t z = (state += 0x9e3779b97f4a7c15ULL);
+            z = (z ^ (z >> 30)) * 0xbf58476d1ce4e5b9ULL;
+            z = (z ^ (z >> 27)) * 0x94d049bb133111ebULL;
+            judge_cc_magic[i] = (long) (z ^ (z >> 31));
+        }
+    }
 % endif
 
-int main(int argc, char *argv[]) {
-    /* Usage: ./main <testid> */
-    if (argc != 2) {
-        return 1;
+/* Exit status when the stack or address space limit was exceeded, see on_segmentation_fault() */
+#define EXIT_MEMORY_LIMIT_EXCEEDED 3
+/* Exit status when a test of a batch exceeded its own deadline, see set_test_deadline() */
+#define EXIT_TIME_LIMIT_EXCEEDED 4
+
+/*
+ * Whether an allocation failed for lack of memory since the current test started. The submission is linked with
+ * --wrap for the allocation functions, such that its calls go through the wrappers below and using the result of a
+ * failed allocation is reported as exceeding the memory limit, see on_segmentation_fault().
+ */
+static volatile sig_atomic_t allocation_failed;
+
+void *__real_malloc(size_t size);
+void *__real_calloc(size_t count, size_t size);
+void *__real_realloc(void *pointer, size_t size);
+void *__real_mmap(void *address, size_t length, int protection, int flags, int file_descriptor, off_t offset);
+
+void *__wrap_malloc(size_t size) {
+    void *pointer = __real_malloc(size);
+    allocation_failed |= pointer == NULL && errno == ENOMEM;
+    return pointer;
+}
+
+void *__wrap_calloc(size_t count, size_t size) {
+    void *pointer = __real_calloc(count, size);
+    allocation_failed |= pointer == NULL && errno == ENOMEM;
+    return pointer;
+}
+
+void *__wrap_realloc(void *pointer, size_t size) {
+    void *new_pointer = __real_realloc(pointer, size);
+    allocation_failed |= new_pointer == NULL && errno == ENOMEM;
+    return new_pointer;
+}
+
+void *__wrap_mmap(void *address, size_t length, int protection, int flags, int file_descriptor, off_t offset) {
+    void *pointer = __real_mmap(address, length, protection, flags, file_descriptor, offset);
+    allocation_failed |= pointer == MAP_FAILED && errno == ENOMEM;
+    return pointer;
+}
+
+/* Record framing of the batch mode, see main() */
+#define RECORD_SEPARATOR '\x1e'
+#define RECORD_STATUS_COMPLETED 0
+
+struct verdict {
+    char text[256];
+    size_t length;
+};
+
+__attribute__((format(printf, 2, 3)))
+static void append_verdict(struct verdict *verdict, const char *format, ...) {
+    size_t remaining = sizeof(verdict->text) - verdict->length;
+    va_list args;
+    va_start(args, format);
+    int written = vsnprintf(verdict->text + verdict->length, remaining, format, args);
+    va_end(args);
+    if (written > 0) {
+        verdict->length += (size_t) written < remaining ? (size_t) written : remaining - 1;
     }
+}
 
-    int test_id = atoi(argv[1]);
+/* Calling convention verdict of the last test that ran, empty if no violation was detected */
+static struct verdict calling_convention_error;
+#define report_calling_convention_error(...) append_verdict(&calling_convention_error, __VA_ARGS__)
+
+% if check_calling_convention:
+    static void report_clobbered_registers(unsigned clobbered) {
+        int count = __builtin_popcount(clobbered);
+        if (count == 0) {
+            return;
+        }
+        report_calling_convention_error("%d register%s: ", count, count > 1 ? "s" : "");
+        const char *separator = "";
+        for (size_t i = 0; i < sizeof(callee_saved_registers) / sizeof(callee_saved_registers[0]); ++i) {
+            if (clobbered & (1u << i)) {
+                report_calling_convention_error("%s%s", separator, callee_saved_registers[i]);
+                separator = ", ";
+            }
+        }
+    }
+% endif
+
+/*
+ * Output verdict of the last test that ran: for every output buffer that differs from its expected output, the index
+ * of its argument and the offset of the first differing byte, as "index:offset", separated by spaces
+ */
+static struct verdict output_error;
+
+/* Return value of the last test that ran */
+static int test_result;
+
+% if native_timing:
+    /* Untimed runs of all iterations before the samples, and the number of timed runs of all iterations */
+    #define TIMING_WARMUP_RUNS 2
+    #define TIMING_SAMPLES 7
+
+    /* Timing verdict of the last test that ran: the minimum and the median time per call in nanoseconds */
+    static struct verdict timing;
+
+    static uint64_t timestamp(void) {
+        struct timespec now;
+        clock_gettime(CLOCK_MONOTONIC, &now);
+        return (uint64_t) now.tv_sec * 1000000000 + (uint64_t) now.tv_nsec;
+    }
+
+    /* Cost of reading the clock, which is subtracted once from every sample, see measure_timer_overhead() */
+    static uint64_t timer_overhead;
+
+    static void measure_timer_overhead(void) {
+        timer_overhead = UINT64_MAX;
+        for (int i = 0; i < 1000; ++i) {
+            uint64_t start = timestamp();
+            uint64_t elapsed = timestamp() - start;
+            timer_overhead = elapsed < timer_overhead ? elapsed : timer_overhead;
+        }
+    }
+
+    static int compare_samples(const void *a, const void *b) {
+        uint64_t left = *(const uint64_t *) a;
+        uint64_t right = *(const uint64_t *) b;
+        return (left > right) - (left < right);
+    }
+% endif
+
+#define TEST_COUNT ${len(plan.tests)}
+
+<%
+    buffer_arguments = [argument for argument in arguments if argument.buffer]
+    arguments_call = []
+    for argument in arguments:
+        if argument.buffer:
+            arguments_call.append(f"({argument.type}) test_buffers[{argument.index}].data")
+            arguments_call.append(f"({argument.length_type}) (test_buffers[{argument.index}].size / sizeof *({argument.type}) 0)")
+        else:
+            arguments_call.append(f"test->argument_{argument.index}")
+    arguments_call = ', '.join(arguments_call)
+%>
+% if buffer_arguments:
+    /* A buffer argument mapped into memory, and its expected output if it has one */
+    struct test_buffer {
+        void *data;
+        size_t size;
+        void *expected;
+        size_t expected_size;
+        /* Copy of the mapped contents, to restore them between timed calls, see restore_test_buffer() */
+        void *initial;
+    };
+
+    static struct test_buffer test_buffers[${len(arguments)}];
+
+    /* Maps the file with the given name in the resources privately, such that writes do not reach the file */
+    static void *map_resource(const char *name, size_t *size) {
+        const char *resources = getenv("JUDGE_RESOURCES");
+        char file_path[4096];
+        snprintf(file_path, sizeof(file_path), "%s/%s", resources ? resources : ".", name);
+        struct stat file_status;
+        int file_descriptor = open(file_path, O_RDONLY);
+        if (file_descriptor < 0 || fstat(file_descriptor, &file_status) != 0) {
+            perror(file_path);
+            exit(1);
+        }
+        *size = (size_t) file_status.st_size;
+        /* Mappings cannot be empty */
+        void *data = mmap(NULL, *size > 0 ? *size : 1, PROT_READ | PROT_WRITE, MAP_PRIVATE, file_descriptor, 0);
+        close(file_descriptor);
+        if (data == MAP_FAILED) {
+            perror(file_path);
+            exit(1);
+        }
+        return data;
+    }
+
+    /* (Re)maps a buffer from its input file, or as zeroes with the size of its expected output, undoing any writes */
+    static void map_test_buffer(struct test_buffer *buffer, const char *input, const char *expected) {
+        if (buffer->data != NULL) {
+            munmap(buffer->data, buffer->size > 0 ? buffer->size : 1);
+        }
+        if (expected != NULL && buffer->expected == NULL) {
+            buffer->expected = map_resource(expected, &buffer->expected_size);
+        }
+        if (input != NULL) {
+            buffer->data = map_resource(input, &buffer->size);
+        } else {
+            buffer->size = buffer->expected_size;
+            buffer->data = mmap(NULL, buffer->size > 0 ? buffer->size : 1, PROT_READ | PROT_WRITE,
+                                MAP_PRIVATE | MAP_ANONYMOUS, -1, 0);
+            if (buffer->data == MAP_FAILED) {
+                perror(expected);
+                exit(1);
+            }
+        }
+    }
+
+    % if native_timing:
+        /*
+         * Restores a buffer to its contents after mapping, keeping a copy of them the first time. Unlike remapping the
+         * buffer, this faults no fresh pages in, so it adds little and steady time to a timed call.
+         */
+        static void restore_test_buffer(struct test_buffer *buffer) {
+            if (buffer->initial == NULL) {
+                buffer->initial = malloc(buffer->size > 0 ? buffer->size : 1);
+                if (buffer->initial == NULL) {
+                    perror("restore_test_buffer");
+                    exit(1);
+                }
+                memcpy(buffer->initial, buffer->data, buffer->size);
+            } else {
+                memcpy(buffer->data, buffer->initial, buffer->size);
+            }
+        }
+    % endif
+
+    /* Compares a buffer with its expected output, if it has one, and unmaps it */
+    static void check_test_buffer(int index, struct test_buffer *buffer) {
+        if (buffer->expected != NULL) {
+            size_t size = buffer->size < buffer->expected_size ? buffer->size : buffer->expected_size;
+            if (buffer->size != buffer->expected_size || memcmp(buffer->data, buffer->expected, size) != 0) {
+                const unsigned char *data = buffer->data;
+                const unsigned char *expected = buffer->expected;
+                size_t offset = 0;
+                while (offset < size && data[offset] == expected[offset]) {
+                    ++offset;
+                }
+                append_verdict(&output_error, "%s%d:%zu", output_error.length > 0 ? " " : "", index, offset);
+            }
+            munmap(buffer->expected, buffer->expected_size > 0 ? buffer->expected_size : 1);
+        }
+        munmap(buffer->data, buffer->size > 0 ? buffer->size : 1);
+        free(buffer->initial);
+        memset(buffer, 0, sizeof(*buffer));
+    }
+% endif
 
-    /* For loop inside the branch so we minimize the overhead for the loop */
-    % for test_id, test in enumerate(plan.tests):
-        if (test_id == ${test_id}) {
-            % if check_calling_convention:
-                #ifdef __x86_64__
-                    register long rbx __asm__("%rbx");
-                    register long r12 __asm__("%r12");
-                    register long r13 __asm__("%r13");
-                    register long r14 __asm__("%r14");
-                    register long r15 __asm__("%r15");
-                    rbx = MAGIC_0;
-                    r12 = MAGIC_1;
-                    r13 = MAGIC_2;
-                    r14 = MAGIC_3;
-                    r15 = MAGIC_4;
-                    OPTIMIZER_HIDE_VAR(rbx);
-                    OPTIMIZER_HIDE_VAR(r12);
-                    OPTIMIZER_HIDE_VAR(r13);
-                    OPTIMIZER_HIDE_VAR(r14);
-                    OPTIMIZER_HIDE_VAR(r15);
-                    long rbp_backup;
-                    __asm__ __volatile__("movq %%rbp, %0" : "=r" (rbp_backup));
-                    OPTIMIZER_HIDE_VAR(rbp_backup);
-                    (void) ${tested_function}(${format_arguments(test.arguments)});
-                    OPTIMIZER_BARRIER();
-                    long rbp_current;
-                    __asm__ __volatile__("movq %%rbp, %0" : "=r" (rbp_current));
-                    long rbx_current = rbx;
-                    long r12_current = r12;
-                    long r13_current = r13;
-                    long r14_current = r14;
-                    long r15_current = r15;
-                    int count = 0;
-                    count += rbx_current != MAGIC_0;
-                    count += r12_current != MAGIC_1;
-                    count += r13_current != MAGIC_2;
-                    count += r14_current != MAGIC_3;
-                    count += r15_current != MAGIC_4;
-                    count += rbp_current != rbp_backup;
-                    if (count > 0) {
-                        fprintf(stderr, "%d register%s: ", count, count > 1 ? "s" : "");
-                        if (rbx_current != MAGIC_0) { fprintf(stderr, "rbx"); if (--count > 0) fprintf(stderr, ", "); }
-                        if (r12_current != MAGIC_1) { fprintf(stderr, "r12"); if (--count > 0) fprintf(stderr, ", "); }
-                        if (r13_current != MAGIC_2) { fprintf(stderr, "r13"); if (--count > 0) fprintf(stderr, ", "); }
-                        if (r14_current != MAGIC_3) { fprintf(stderr, "r14"); if (--count > 0) fprintf(stderr, ", "); }
-                        if (r15_current != MAGIC_4) { fprintf(stderr, "r15"); if (--count > 0) fprintf(stderr, ", "); }
-                        if (rbp_current != rbp_backup) { fprintf(stderr, "rbp"); }
-                    }
-                #elif defined(__i386__)
-                    register int ebx __asm__("%ebx");
-                    register int esi __asm__("%esi");
-                    register int edi __asm__("%edi");
-                    ebx = (int) MAGIC_0;
-                    esi = (int) MAGIC_1;
-                    edi = (int) MAGIC_2;
-                    OPTIMIZER_HIDE_VAR(ebx);
-                    OPTIMIZER_HIDE_VAR(esi);
-                    OPTIMIZER_HIDE_VAR(edi);
-                    int ebp_backup;
-                    __asm__ __volatile__("movl %%ebp, %0" : "=r" (ebp_backup));
-                    OPTIMIZER_HIDE_VAR(ebp_backup);
-                    (void) ${tested_function}(${format_arguments(test.arguments)});
-                    OPTIMIZER_BARRIER();
-                    int ebp_current;
-                    __asm__ __volatile__("movl %%ebp, %0" : "=r" (ebp_current));
-                    int ebx_current = ebx;
-                    int esi_current = esi;
-                    int edi_current = edi;
-                    int count = 0;
-                    count += ebx_current != (int) MAGIC_0;
-                    count += esi_current != (int) MAGIC_1;
-                    count += edi_current != (int) MAGIC_2;
-                    count += ebp_current != ebp_backup;
-                    if (count > 0) {
-                        fprintf(stderr, "%d register%s: ", count, count > 1 ? "s" : "");
-                        if (ebx_current != (int) MAGIC_0) { fprintf(stderr, "ebx"); if (--count > 0) fprintf(stderr, ", "); }
-                        if (esi_current != (int) MAGIC_1) { fprintf(stderr, "esi"); if (--count > 0) fprintf(stderr, ", "); }
-                        if (edi_current != (int) MAGIC_2) { fprintf(stderr, "edi"); if (--count > 0) fprintf(stderr, ", "); }
-                        if (ebp_current != ebp_backup) { fprintf(stderr, "ebp"); }
-                    }
-                #elif defined(__arm__)
-                    register int r4 __asm__("%r4");
-                    register int r5 __asm__("%r5");
-                    register int r6 __asm__("%r6");
-                    register int r7 __asm__("%r7");
-                    register int r8 __asm__("%r8");
-                    register int r9 __asm__("%r9");
-                    register int r10 __asm__("%r10");
-                    register int r11 __asm__("%r11");
-                    r4 = (int) MAGIC_7;
-                    r5 = (int) MAGIC_0;
-                    r6 = (int) MAGIC_1;
-                    r7 = (int) MAGIC_2;
-                    r8 = (int) MAGIC_3;
-                    r9 = (int) MAGIC_4;
-                    r10 = (int) MAGIC_5;
-                    r11 = (int) MAGIC_6;
-                    OPTIMIZER_HIDE_VAR(r4);
-                    OPTIMIZER_HIDE_VAR(r5);
-                    OPTIMIZER_HIDE_VAR(r6);
-                    OPTIMIZER_HIDE_VAR(r7);
-                    OPTIMIZER_HIDE_VAR(r8);
-                    OPTIMIZER_HIDE_VAR(r9);
-                    OPTIMIZER_HIDE_VAR(r10);
-                    OPTIMIZER_HIDE_VAR(r11);
-                    (void) ${tested_function}(${format_arguments(test.arguments)});
-                    OPTIMIZER_BARRIER();
-                    int r4_current = r4;
-                    int r5_current = r5;
-                    int r6_current = r6;
-                    int r7_current = r7;
-                    int r8_current = r8;
-                    int r9_current = r9;
-                    int r10_current = r10;
-                    int r11_current = r11;
-                    int count = 0;
-                    count += r4_current != (int) MAGIC_7;
-                    count += r5_current != (int) MAGIC_0;
-                    count += r6_current != (int) MAGIC_1;
-                    count += r7_current != (int) MAGIC_2;
-                    count += r8_current != (int) MAGIC_3;
-                    count += r9_current != (int) MAGIC_4;
-                    count += r10_current != (int) MAGIC_5;
-                    count += r11_current != (int) MAGIC_6;
-                    if (count > 0) {
-                        fprintf(stderr, "%d register%s: ", count, count > 1 ? "s" : "");
-                        if (r4_current != (int) MAGIC_7) { fprintf(stderr, "r4"); if (--count > 0) fprintf(stderr, ", "); }
-                        if (r5_current != (int) MAGIC_0) { fprintf(stderr, "r5"); if (--count > 0) fprintf(stderr, ", "); }
-                        if (r6_current != (int) MAGIC_1) { fprintf(stderr, "r6"); if (--count > 0) fprintf(stderr, ", "); }
-                        if (r7_current != (int) MAGIC_2) { fprintf(stderr, "r7"); if (--count > 0) fprintf(stderr, ", "); }
-                        if (r8_current != (int) MAGIC_3) { fprintf(stderr, "r8"); if (--count > 0) fprintf(stderr, ", "); }
-                        if (r9_current != (int) MAGIC_4) { fprintf(stderr, "r9"); if (--count > 0) fprintf(stderr, ", "); }
-                        if (r10_current != (int) MAGIC_5) { fprintf(stderr, "r10"); if (--count > 0) fprintf(stderr, ", "); }
-                        if (r11_current != (int) MAGIC_6) { fprintf(stderr, "r11"); }
-                    }
-                #elif defined(__aarch64__)
-                    register long x19 __asm__("%x19");
-                    register long x20 __asm__("%x20");
-                    register long x21 __asm__("%x21");
-                    register long x22 __asm__("%x22");
-                    register long x23 __asm__("%x23");
-                    register long x24 __asm__("%x24");
-                    register long x25 __asm__("%x25");
-                    register long x26 __asm__("%x26");
-                    register long x27 __asm__("%x27");
-                    register long x28 __asm__("%x28");
-                    register long x29 __asm__("%x29");
-                    x19 = MAGIC_10;
-                    x20 = MAGIC_0;
-                    x21 = MAGIC_1;
-                    x22 = MAGIC_2;
-                    x23 = MAGIC_3;
-                    x24 = MAGIC_4;
-                    x25 = MAGIC_5;
-                    x26 = MAGIC_6;
-                    x27 = MAGIC_7;
-                    x28 = MAGIC_8;
-                    x29 = MAGIC_9;
-                    OPTIMIZER_HIDE_VAR(x19);
-                    OPTIMIZER_HIDE_VAR(x20);
-                    OPTIMIZER_HIDE_VAR(x21);
-                    OPTIMIZER_HIDE_VAR(x22);
-                    OPTIMIZER_HIDE_VAR(x23);
-                    OPTIMIZER_HIDE_VAR(x24);
-                    OPTIMIZER_HIDE_VAR(x25);
-                    OPTIMIZER_HIDE_VAR(x26);
-                    OPTIMIZER_HIDE_VAR(x27);
-                    OPTIMIZER_HIDE_VAR(x28);
-                    OPTIMIZER_HIDE_VAR(x29);
-                    (void) ${tested_function}(${format_arguments(test.arguments)});
-                    OPTIMIZER_BARRIER();
-                    long x19_current = x19;
-                    long x20_current = x20;
-                    long x21_current = x21;
-                    long x22_current = x22;
-                    long x23_current = x23;
-                    long x24_current = x24;
-                    long x25_current = x25;
-                    long x26_current = x26;
-                    long x27_current = x27;
-                    long x28_current = x28;
-                    long x29_current = x29;
-                    long count = 0;
-                    count += x19_current != MAGIC_10;
-                    count += x20_current != MAGIC_0;
-                    count += x21_current != MAGIC_1;
-                    count += x22_current != MAGIC_2;
-                    count += x23_current != MAGIC_3;
-                    count += x24_current != MAGIC_4;
-                    count += x25_current != MAGIC_5;
-                    count += x26_current != MAGIC_6;
-                    count += x27_current != MAGIC_7;
-                    count += x28_current != MAGIC_8;
-                    count += x29_current != MAGIC_9;
-                    if (count > 0) {
-                        fprintf(stderr, "%d register%s: ", count, count > 1 ? "s" : "");
-                        if (x19_current != MAGIC_10) { fprintf(stderr, "x19"); if (--count > 0) fprintf(stderr, ", "); }
-                        if (x20_current != MAGIC_0) { fprintf(stderr, "x20"); if (--count > 0) fprintf(stderr, ", "); }
-                        if (x21_current != MAGIC_1) { fprintf(stderr, "x21"); if (--count > 0) fprintf(stderr, ", "); }
-                        if (x22_current != MAGIC_2) { fprintf(stderr, "x22"); if (--count > 0) fprintf(stderr, ", "); }
-                        if (x23_current != MAGIC_3) { fprintf(stderr, "x23"); if (--count > 0) fprintf(stderr, ", "); }
-                        if (x24_current != MAGIC_4) { fprintf(stderr, "x24"); if (--count > 0) fprintf(stderr, ", "); }
-                        if (x25_current != MAGIC_5) { fprintf(stderr, "x25"); if (--count > 0) fprintf(stderr, ", "); }
-                        if (x26_current != MAGIC_6) { fprintf(stderr, "x26"); if (--count > 0) fprintf(stderr, ", "); }
-                        if (x27_current != MAGIC_7) { fprintf(stderr, "x27"); if (--count > 0) fprintf(stderr, ", "); }
-                        if (x28_current != MAGIC_8) { fprintf(stderr, "x28"); if (--count > 0) fprintf(stderr, ", "); }
-                        if (x29_current != MAGIC_9) { fprintf(stderr, "x29"); }
-                    }
-                #endif
-                fflush(stderr);
-                OPTIMIZER_BARRIER();
+% if arguments:
+    /* Arguments of every test, such that all tests share a single call path, buffers are given by their files */
+    struct test_arguments {
+        % for argument in arguments:
+            % if argument.buffer:
+                const char *argument_${argument.index}_input;
+                const char *argument_${argument.index}_expected;
+            % else:
+                ${argument.type} argument_${argument.index};
             % endif
+        % endfor
+    };
+
+    static const struct test_arguments test_arguments[] = {
+        % for test in plan.tests:
+            { ${format_harness_arguments(test.arguments)} },
+        % endfor
+        % if not plan.tests:
+            /* Arrays cannot be empty */
+            { 0 },
+        % endif
+    };
+% endif
+
+<%def name="map_test_buffers()">
+    % for argument in buffer_arguments:
+        map_test_buffer(&test_buffers[${argument.index}], test->argument_${argument.index}_input, test->argument_${argument.index}_expected);
+    % endfor
+</%def>
+
+<%def name="restore_test_buffers()">
+    % for argument in buffer_arguments:
+        restore_test_buffer(&test_buffers[${argument.index}]);
+    % endfor
+</%def>
+
+/* Runs the test associated with test_id, returns 0 if there is no such test */
+static int run_test(int test_id) {
+    allocation_failed = 0;
+    calling_convention_error.text[0] = '\0';
+    calling_convention_error.length = 0;
+    output_error.text[0] = '\0';
+    output_error.length = 0;
+    % if native_timing:
+        timing.text[0] = '\0';
+        timing.length = 0;
+    % endif
 
-            int result;
-            for (int i = 0; i < ${test_iterations}; ++i) {
-                result = ${tested_function}(${format_arguments(test.arguments)});
+    if (test_id < 0 || test_id >= TEST_COUNT) {
+        return 0;
+    }
+    % if arguments:
+        /* The pointer lives in memory, so a submission clobbering callee-saved registers cannot derail the arguments */
+        const struct test_arguments *volatile test = &test_arguments[test_id];
+    % endif
+
+    % if check_calling_convention:
+        ${map_test_buffers()}
+        judge_cc_target = (void *) ${tested_function};
+        (void) judge_cc_trampoline(${arguments_call});
+        report_clobbered_registers(judge_cc_clobbered);
+    % endif
+
+    % if native_timing:
+        /*
+         * Every sample times the whole loop over all iterations, as calls too short for the resolution of the clock
+         * would otherwise be timed as 0. The counters and timestamps live in memory, so a submission clobbering
+         * callee-saved registers cannot derail the loops or the timing.
+         */
+        volatile uint64_t overhead = timer_overhead;
+        % if buffer_arguments:
+            /*
+             * The buffers are mapped once and restored before every call, which is no part of the call, so the cost
+             * of restoring them is subtracted as well
+             */
+            ${map_test_buffers()}
+            ${restore_test_buffers()}
+            overhead = UINT64_MAX;
+            for (volatile int sample = 0; sample < TIMING_SAMPLES; ++sample) {
+                volatile uint64_t start = timestamp();
+                for (volatile int i = 0; i < ${test_iterations}; ++i) {
+                    ${restore_test_buffers()}
+                }
+                uint64_t elapsed = timestamp() - start;
+                overhead = elapsed < overhead ? elapsed : overhead;
+            }
+        % endif
+        static uint64_t samples[TIMING_SAMPLES];
+        for (volatile int sample = -TIMING_WARMUP_RUNS; sample < TIMING_SAMPLES; ++sample) {
+            volatile uint64_t start = timestamp();
+            for (volatile int i = 0; i < ${test_iterations}; ++i) {
+                ${restore_test_buffers()}
+                test_result = ${tested_function}(${arguments_call});
             }
-            printf("%d", result);
+            uint64_t elapsed = timestamp() - start;
+            if (sample >= 0) {
+                samples[sample] = elapsed > overhead ? elapsed - overhead : 0;
+            }
+        }
+        qsort(samples, TIMING_SAMPLES, sizeof(samples[0]), compare_samples);
+        append_verdict(&timing, "%llu %llu", (unsigned long long) (samples[0] / ${test_iterations}),
+                       (unsigned long long) (samples[TIMING_SAMPLES / 2] / ${test_iterations}));
+    % elif measure_single_iteration:
+        STOP_INSTRUMENTATION();
+        /* The loop counter lives in memory, so a submission clobbering callee-saved registers cannot derail the loop */
+        for (volatile int i = 0; i < ${test_iterations}; ++i) {
+            ${map_test_buffers()}
+            if (i == ${test_iterations} - 1) {
+                /* Instrumentation stays on until the costs of the test are dumped, see judge_test_done() */
+                START_INSTRUMENTATION();
+                test_result = judge_measured_call(${arguments_call});
+            } else {
+                test_result = ${tested_function}(${arguments_call});
+            }
+        }
+    % else:
+        /* The loop counter lives in memory, so a submission clobbering callee-saved registers cannot derail the loop */
+        for (volatile int i = 0; i < ${test_iterations}; ++i) {
+            ${map_test_buffers()}
+            test_result = ${tested_function}(${arguments_call});
         }
+    % endif
+    % for argument in buffer_arguments:
+        check_test_buffer(${argument.index}, &test_buffers[${argument.index}]);
     % endfor
+    return 1;
+}
 
+/* Writes the result of the last test that ran as a record, see main() */
+static void write_record(int test_id) {
+    printf("%c%d\t%d\t%d\t%s\t%s\t%s\n", RECORD_SEPARATOR, test_id, RECORD_STATUS_COMPLETED, test_result,
+           output_error.text, ${"timing.text" if native_timing else '""'}, calling_convention_error.text);
     fflush(stdout);
+}
+
+/* Address close to the top of the stack, taken at the start of main() */
+static char *stack_top;
+static char alternate_stack[65536];
+
+static void on_segmentation_fault(int signal_number, siginfo_t *info, void *context) {
+    struct rlimit stack_limit;
+    char *address = info->si_addr;
+    /* Faults after an allocation failed most likely use its result */
+    if (allocation_failed) {
+        _exit(EXIT_MEMORY_LIMIT_EXCEEDED);
+    }
+    /* Faults below the stack limit (including the guard gap) are stack overflows */
+    if (getrlimit(RLIMIT_STACK, &stack_limit) == 0 && stack_limit.rlim_cur != RLIM_INFINITY
+            && address < stack_top && (size_t) (stack_top - address) <= stack_limit.rlim_cur + sizeof(alternate_stack)) {
+        _exit(EXIT_MEMORY_LIMIT_EXCEEDED);
+    }
+    /* Any other fault is a crash: the handler was reset, so returning lets the fault happen again with the default action */
+}
+
+/*
+ * Makes a stack overflow, or a fault after a failed allocation, exit with EXIT_MEMORY_LIMIT_EXCEEDED instead of crashing
+ * like any other fault
+ */
+static void detect_stack_overflow(void) {
+    char top;
+    stack_top = &top;
+
+    stack_t stack = { .ss_sp = alternate_stack, .ss_size = sizeof(alternate_stack), .ss_flags = 0 };
+    struct sigaction action;
+    memset(&action, 0, sizeof(action));
+    action.sa_sigaction = on_segmentation_fault;
+    action.sa_flags = SA_SIGINFO | SA_ONSTACK | SA_RESETHAND;
+    sigemptyset(&action.sa_mask);
+    if (sigaltstack(&stack, NULL) == 0) {
+        sigaction(SIGSEGV, &action, NULL);
+    }
+}
+
+/*
+ * Marks the end of a test in batch mode (and in single test mode when measuring a single iteration), callgrind dumps the
+ * costs of every test when leaving this function
+ */
+__attribute__((noinline)) void judge_test_done(void) {
+    OPTIMIZER_BARRIER();
+}
+
+/* Runs a test in a child of the fork server, with its output in files of its own, see fork_server() */
+static void run_forked_test(int test_id, unsigned long long output_limit) {
+    char stdout_path[64];
+    char stderr_path[64];
+    snprintf(stdout_path, sizeof(stdout_path), "fork-server-%d.stdout", test_id);
+    snprintf(stderr_path, sizeof(stderr_path), "fork-server-%d.stderr", test_id);
+    int stdin_descriptor = open("/dev/null", O_RDONLY);
+    int stdout_descriptor = open(stdout_path, O_WRONLY | O_CREAT | O_TRUNC, 0644);
+    int stderr_descriptor = open(stderr_path, O_WRONLY | O_CREAT | O_TRUNC, 0644);
+    if (stdin_descriptor < 0 || stdout_descriptor < 0 || stderr_descriptor < 0) {
+        _exit(1);
+    }
+    dup2(stdin_descriptor, STDIN_FILENO);
+    dup2(stdout_descriptor, STDOUT_FILENO);
+    dup2(stderr_descriptor, STDERR_FILENO);
+    close(stdin_descriptor);
+    close(stdout_descriptor);
+    close(stderr_descriptor);
+
+    /* Writing more than the output limit kills the test with SIGXFSZ */
+    if (output_limit > 0) {
+        struct rlimit file_size_limit = { .rlim_cur = output_limit + 1, .rlim_max = output_limit + 1 };
+        setrlimit(RLIMIT_FSIZE, &file_size_limit);
+    }
+
+    if (run_test(test_id)) {
+        write_record(test_id);
+    }
+    fflush(stdout);
+    _exit(0);
+}
+
+/*
+ * Reads test ids from stdin, one per line, and runs every test in a forked child. For every test, the pid of the child
+ * is written to stdout once it is started, followed by "exit <status>" or "signal <number>" once it has finished.
+ */
+static int fork_server(unsigned long long output_limit) {
+    char line[32];
+    while (fgets(line, sizeof(line), stdin) != NULL) {
+        int test_id = atoi(line);
+        fflush(stdout);
+        pid_t pid = fork();
+        if (pid < 0) {
+            return 1;
+        }
+        if (pid == 0) {
+            run_forked_test(test_id, output_limit);
+        }
+        printf("%d\n", (int) pid);
+        fflush(stdout);
+
+        int status;
+        while (waitpid(pid, &status, 0) < 0) {
+            if (errno != EINTR) {
+                return 1;
+            }
+        }
+        if (WIFSIGNALED(status)) {
+            printf("signal %d\n", WTERMSIG(status));
+        } else {
+            printf("exit %d\n", WEXITSTATUS(status));
+        }
+        fflush(stdout);
+    }
+    return 0;
+}
+
+static void on_test_deadline(int signal_number) {
+    (void) signal_number;
+    _exit(EXIT_TIME_LIMIT_EXCEEDED);
+}
+
+/* Makes the program exit with EXIT_TIME_LIMIT_EXCEEDED after the given number of milliseconds, 0 cancels the deadline */
+static void set_test_deadline(unsigned long milliseconds) {
+    struct itimerval timer = {
+        .it_interval = { 0, 0 },
+        .it_value = { (time_t) (milliseconds / 1000), (suseconds_t) (milliseconds % 1000 * 1000) },
+    };
+    setitimer(ITIMER_REAL, &timer, NULL);
+}
+
+int main(int argc, char *argv[]) {
+    /*
+     * Usage: ./main <testid>
+     *        ./main --batch <test timeout> [testid...]
+     *        ./main --fork-server <output limit>
+     *
+     * The first form runs a single test, the second form runs the given tests (all tests if none are given) in one
+     * process, in which every test has to finish within the test timeout in milliseconds (0 for no timeout). The third form runs every test it receives in a child process of its own, see fork_server(), whose
+     * output is written to fork-server-<testid>.stdout and fork-server-<testid>.stderr in the working directory.
+     * Each completed test writes one record to stdout:
+     * RECORD_SEPARATOR test_id TAB status TAB return value TAB output verdict TAB timing verdict TAB calling convention
+     * verdict NEWLINE.
+     * Records are flushed immediately, such that the completed tests are not lost if a later test crashes.
+     * Buffer arguments are read from the directory in the JUDGE_RESOURCES environment variable. The timing verdict is
+     * only filled in with native timing: the minimum and the median time per call in nanoseconds, separated by a space.
+     *
+     * Exceeding the stack limit, or faulting after an allocation failed, exits with EXIT_MEMORY_LIMIT_EXCEEDED.
+     * Exceeding the test timeout of a batch exits with EXIT_TIME_LIMIT_EXCEEDED.
+     */
+    detect_stack_overflow();
+    % if check_calling_convention:
+        seed_magic_numbers();
+    % endif
+    % if native_timing:
+        measure_timer_overhead();
+    % endif
+
+    if (argc >= 3 && strcmp(argv[1], "--batch") == 0) {
+        unsigned long test_timeout = strtoul(argv[2], NULL, 10);
+        signal(SIGALRM, on_test_deadline);
+        int test_count = argc > 3 ? argc - 3 : ${len(plan.tests)};
+        for (int i = 0; i < test_count; ++i) {
+            int test_id = argc > 3 ? atoi(argv[i + 3]) : i;
+            set_test_deadline(test_timeout);
+            int ran = run_test(test_id);
+            set_test_deadline(0);
+            if (ran) {
+                write_record(test_id);
+                judge_test_done();
+            }
+        }
+        return 0;
+    }
+
+    if (argc == 3 && strcmp(argv[1], "--fork-server") == 0) {
+        return fork_server(strtoull(argv[2], NULL, 10));
+    }
+
+    if (argc != 2) {
+        return 1;
+    }
+
+    int test_id = atoi(argv[1]);
+    if (run_test(test_id)) {
+        write_record(test_id);
+        % if measure_single_iteration:
+            judge_test_done();
+        % endif
+    }
     return 0;
 }
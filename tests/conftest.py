@@ -0,0 +1,71 @@
+import io
+import json
+import os
+import sys
+from os import path
+from types import SimpleNamespace
+
+import pytest
+
+JUDGE_DIRECTORY = path.dirname(path.dirname(path.realpath(__file__)))
+sys.path.insert(0, JUDGE_DIRECTORY)
+
+from dodona.dodona_config import DodonaConfig  # noqa: E402
+from dodona.translator import Translator  # noqa: E402
+
+PLAN = {"tests": [
+    {"arguments": [1, 2], "expected_return_value": 3},
+    {"arguments": [5, 7], "expected_return_value": 12},
+    {"arguments": [-4, 2], "expected_return_value": -2},
+]}
+
+CORRECT_SUBMISSION = """add:
+    movl %edi, %eax
+    addl %esi, %eax
+    ret
+"""
+
+
+@pytest.fixture
+def exercise(tmp_path):
+    """An exercise that tests add(int, int) on x86-64, with its evaluation directory and a correct submission."""
+    resources = tmp_path / "evaluation"
+    resources.mkdir()
+    (resources / "plan.json").write_text(json.dumps(PLAN))
+    source = tmp_path / "submission.s"
+    source.write_text(CORRECT_SUBMISSION)
+    workdir = tmp_path / "workdir"
+    workdir.mkdir()
+    return SimpleNamespace(
+        directory=tmp_path,
+        raw_config={
+            "memory_limit": 500000000,
+            "time_limit": 10,
+            "programming_language": "assembly",
+            "natural_language": "en",
+            "resources": str(resources),
+            "source": str(source),
+            "judge": JUDGE_DIRECTORY,
+            "workdir": str(workdir),
+            "plan_name": "plan.json",
+            "assembly": "x86-64-at&t",
+            "tested_function": "add",
+            "tested_arguments": ["int", "int"],
+            "test_iterations": 1,
+            "measure_performance": False,
+            "check_calling_convention": True,
+        },
+    )
+
+
+def load_config(raw_config: dict) -> DodonaConfig:
+    """Reads and processes a run configuration like the judge does."""
+    config = DodonaConfig.from_json(io.StringIO(json.dumps(raw_config)))
+    config.translator = Translator.from_str(config.natural_language)
+    config.process_judge_specific_options()
+    return config
+
+
+def load_plan(config: DodonaConfig) -> SimpleNamespace:
+    with open(os.path.join(config.resources, config.plan_name)) as plan_file:
+        return json.load(plan_file, object_hook=lambda d: SimpleNamespace(**d))
@@ -0,0 +1,129 @@
+import json
+import subprocess
+import sys
+from os import path
+from typing import List
+
+import pytest
+
+from conftest import CORRECT_SUBMISSION, JUDGE_DIRECTORY, PLAN, load_config
+from evaluation import scheduler
+from evaluation.scheduler import TimeBudget
+
+
+def run_judge(raw_config: dict) -> List[dict]:
+    """Runs a judgement and returns its Dodona commands."""
+    result = subprocess.run([sys.executable, path.join(JUDGE_DIRECTORY, "assembly_judge.py")],
+                            input=json.dumps(raw_config), stdout=subprocess.PIPE, universal_newlines=True,
+                            cwd=raw_config["workdir"], check=True, timeout=60)
+    return [json.loads(line) for line in result.stdout.splitlines()]
+
+
+def write_plan(exercise, plan: dict):
+    with open(path.join(exercise.raw_config["resources"], "plan.json"), "w") as plan_file:
+        json.dump(plan, plan_file)
+
+
+def with_max_nanoseconds(max_nanoseconds: int) -> dict:
+    return {**PLAN, "tests": [{**test, "max_nanoseconds": max_nanoseconds} for test in PLAN["tests"]]}
+
+
+@pytest.mark.parametrize("stop_after_failures", ["2", 1.5, 0, True])
+def test_invalid_stop_after_failures_is_a_config_error(exercise, stop_after_failures):
+    write_plan(exercise, {**PLAN, "stop_after_failures": stop_after_failures})
+
+    commands = run_judge(exercise.raw_config)
+
+    assert commands[-1]["command"] == "close-judgement"
+    assert commands[-1]["status"]["enum"] == "internal error"
+    assert not any(command["command"] == "start-testcase" for command in commands)
+
+
+def test_native_timings_are_not_cached(exercise):
+    write_plan(exercise, with_max_nanoseconds(1000000))
+    result_cache_dir = exercise.directory / "result-cache"
+    run_judge({**exercise.raw_config, "measure_performance": True, "performance_backend": "native",
+               "result_cache_dir": str(result_cache_dir)})
+
+    assert not result_cache_dir.exists() or not any(result_cache_dir.iterdir())
+
+
+def test_native_timing_without_max_nanoseconds_is_a_config_error(exercise):
+    tests = with_max_nanoseconds(1000000)["tests"]
+    write_plan(exercise, {**PLAN, "tests": [tests[0], PLAN["tests"][1], tests[2]]})
+
+    commands = run_judge({**exercise.raw_config, "measure_performance": True, "performance_backend": "native"})
+
+    assert commands[-1]["status"]["enum"] == "internal error"
+    assert not any(command["command"] == "start-testcase" for command in commands)
+
+
+@pytest.mark.parametrize("max_nanoseconds, status", [(1, "wrong"), (10 ** 9, "correct")])
+def test_calls_shorter_than_the_clock_resolution_are_timed(exercise, max_nanoseconds, status):
+    write_plan(exercise, with_max_nanoseconds(max_nanoseconds))
+    # Some tens of nanoseconds per call, which a clock read around every single call would often time as 0
+    (exercise.directory / "submission.s").write_text(CORRECT_SUBMISSION.replace(
+        "ret", "xorl %eax, %eax\n" + "    addl %eax, %eax\n" * 100 + "    movl %edi, %eax\n    addl %esi, %eax\n    ret"))
+
+    commands = run_judge({**exercise.raw_config, "measure_performance": True, "performance_backend": "native",
+                          "test_iterations": 100})
+
+    assert commands[-1]["status"]["enum"] == status
+
+
+def test_test_that_loops_in_a_batch_only_uses_its_own_deadline(exercise):
+    # add(5, 7) loops forever
+    (exercise.directory / "submission.s").write_text(CORRECT_SUBMISSION.replace(
+        "add:\n", "add:\n    cmpl $5, %edi\n    jne 1f\n2:  jmp 2b\n1:\n"))
+    raw_config = {**exercise.raw_config, "time_limit": 3}
+
+    commands = run_judge(raw_config)
+    batch_commands = run_judge({**raw_config, "batch_tests": True})
+
+    assert batch_commands == commands
+    assert [command["generated"] for command in commands if command["command"] == "close-test"] == ["3", "-2"]
+    assert commands[-1]["status"]["enum"] == "time limit exceeded"
+
+
+# Allocate 64 MiB blocks and write to them until an allocation fails, then write through its result
+ALLOCATING_SUBMISSIONS = {
+    "malloc": """add:
+    pushq %rbx
+1:  movl $0x4000000, %edi
+    call malloc
+    movb $1, (%rax)
+    jmp 1b
+""",
+    "mmap": """add:
+    pushq %rbx
+1:  xorl %edi, %edi
+    movl $0x4000000, %esi
+    movl $3, %edx
+    movl $0x22, %ecx
+    movl $-1, %r8d
+    xorl %r9d, %r9d
+    call mmap
+    movb $1, (%rax)
+    jmp 1b
+""",
+}
+
+
+@pytest.mark.parametrize("allocation", ALLOCATING_SUBMISSIONS)
+def test_running_out_of_memory_exceeds_the_memory_limit(exercise, allocation):
+    (exercise.directory / "submission.s").write_text(ALLOCATING_SUBMISSIONS[allocation])
+
+    commands = run_judge({**exercise.raw_config, "check_calling_convention": False})
+
+    assert commands[-1]["status"]["enum"] == "memory limit exceeded"
+
+
+def test_memory_limit_of_a_test_does_not_depend_on_the_workers(exercise, monkeypatch):
+    config = load_config({**exercise.raw_config, "parallel_tests": True})
+    limits = []
+    for cpu_count in (1, 8):
+        monkeypatch.setattr(scheduler, "available_cpu_count", lambda: cpu_count)
+        with scheduler.TestScheduler(config.translator, "program", config, [0, 1, 2], TimeBudget(10)) as tests:
+            limits.append(tests.memory_limit)
+
+    assert limits[0] == limits[1] == int(config.memory_limit * scheduler.TestScheduler.TEST_MEMORY_SHARE)
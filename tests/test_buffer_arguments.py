@@ -0,0 +1,75 @@
+import json
+import struct
+from os import path
+
+from test_assembly_judge import run_judge
+
+# int f(int *a, long n): returns the sum of the elements and overwrites element i with ~i
+SUBMISSION = """f:
+    xorl %eax, %eax
+    xorq %rcx, %rcx
+1:  cmpq %rsi, %rcx
+    jge 2f
+    addl (%rdi,%rcx,4), %eax
+    movl %ecx, %edx
+    notl %edx
+    movl %edx, (%rdi,%rcx,4)
+    incq %rcx
+    jmp 1b
+2:  ret
+"""
+
+
+def buffer_exercise(exercise, tests, files):
+    resources = exercise.raw_config["resources"]
+    for file_name, values in files.items():
+        with open(path.join(resources, file_name), "wb") as buffer_file:
+            buffer_file.write(struct.pack(f"<{len(values)}i", *values))
+    with open(path.join(resources, "plan.json"), "w") as plan_file:
+        json.dump({"tests": tests}, plan_file)
+    with open(exercise.raw_config["source"], "w") as source_file:
+        source_file.write(SUBMISSION)
+    return {**exercise.raw_config, "tested_function": "f", "tested_arguments": ["int *", "long"]}
+
+
+def closed_tests(commands):
+    return [command for command in commands if command["command"] == "close-test"]
+
+
+def test_output_buffers_are_compared_with_their_expected_output(exercise):
+    raw_config = buffer_exercise(exercise, [
+        {"arguments": [{"buffer": "input.bin", "expected": "output.bin"}], "expected_return_value": 6},
+        {"arguments": [{"buffer": "input.bin", "expected": "wrong.bin"}], "expected_return_value": 6},
+    ], {"input.bin": [1, 2, 3], "output.bin": [-1, -2, -3], "wrong.bin": [-1, -2, -4]})
+
+    commands = run_judge(raw_config)
+
+    buffer_tests = [test for test in closed_tests(commands) if test["generated"] != "6"]
+    assert [test["accepted"] for test in buffer_tests] == [True, False]
+    assert "byte 8" in buffer_tests[1]["generated"]
+    assert commands[-1]["status"]["enum"] == "wrong"
+
+
+def test_missing_expected_file_is_a_config_error(exercise):
+    raw_config = buffer_exercise(exercise, [
+        {"arguments": [{"buffer": "input.bin", "expected": "missing.bin"}], "expected_return_value": 6},
+    ], {"input.bin": [1, 2, 3]})
+
+    commands = run_judge(raw_config)
+
+    assert commands[-1]["status"]["enum"] == "internal error"
+    assert any("missing.bin" in json.dumps(command) for command in commands)
+    assert not closed_tests(commands)
+
+
+def test_restoring_buffers_is_not_timed(exercise):
+    # Remapping the buffer and faulting its page in takes microseconds, summing three elements does not
+    raw_config = buffer_exercise(exercise, [
+        {"arguments": [{"buffer": "input.bin", "expected": "output.bin"}], "expected_return_value": 6,
+         "max_nanoseconds": 2000},
+    ], {"input.bin": [1, 2, 3], "output.bin": [-1, -2, -3]})
+
+    commands = run_judge({**raw_config, "measure_performance": True, "performance_backend": "native",
+                          "test_iterations": 10})
+
+    assert commands[-1]["status"]["enum"] == "correct"
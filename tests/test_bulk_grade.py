@@ -0,0 +1,53 @@
+import json
+import subprocess
+import sys
+from os import path
+
+from bulk_grade import result_names
+from conftest import CORRECT_SUBMISSION, JUDGE_DIRECTORY
+
+EXERCISE_SETTINGS = ("assembly", "tested_function", "tested_arguments", "test_iterations", "measure_performance",
+                     "check_calling_convention")
+
+
+def test_flattened_names_that_collide_are_disambiguated(tmp_path):
+    assert result_names([str(tmp_path / "a_b" / "x.s"), str(tmp_path / "a" / "b_x.s"), str(tmp_path / "c" / "y.s")]) \
+        == ["a_b_x.s-0.json", "a_b_x.s-1.json", "c_y.s.json"]
+
+
+def write_exercise_config(exercise):
+    evaluation = {setting: exercise.raw_config[setting] for setting in EXERCISE_SETTINGS}
+    (exercise.directory / "config.json").write_text(json.dumps({"evaluation": evaluation}))
+
+
+def test_concurrent_submissions_are_all_graded(exercise):
+    write_exercise_config(exercise)
+    submissions = []
+    for index in range(8):
+        submission = exercise.directory / "submissions" / f"student{index}" / "add.s"
+        submission.parent.mkdir(parents=True)
+        submission.write_text(CORRECT_SUBMISSION)
+        submissions.append(str(submission))
+    output = exercise.directory / "results"
+
+    subprocess.run([sys.executable, path.join(JUDGE_DIRECTORY, "bulk_grade.py"), exercise.raw_config["resources"],
+                    *submissions, "--output", str(output), "--workers", "4"], check=True, timeout=120)
+
+    for name in result_names(submissions):
+        last_command = json.loads((output / name).read_text().splitlines()[-1])
+        assert last_command["command"] == "close-judgement"
+        assert last_command["status"]["enum"] == "correct"
+
+
+def test_failed_judgements_are_reported(exercise):
+    write_exercise_config(exercise)
+    missing = str(exercise.directory / "missing" / "add.s")
+
+    result = subprocess.run([sys.executable, path.join(JUDGE_DIRECTORY, "bulk_grade.py"),
+                             exercise.raw_config["resources"], exercise.raw_config["source"], missing,
+                             "--output", str(exercise.directory / "results")],
+                            stderr=subprocess.PIPE, universal_newlines=True, timeout=120)
+
+    assert result.returncode == 1
+    assert missing in result.stderr
+    assert exercise.raw_config["source"] not in result.stderr
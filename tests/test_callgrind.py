@@ -0,0 +1,56 @@
+from evaluation.profiling import TEST_DONE_MARKER, parse_callgrind_batch_output, parse_callgrind_dump
+
+TEST_DUMP = f"""version: 1
+creator: callgrind-3.19.0
+desc: Trigger: --dump-after={TEST_DONE_MARKER}
+positions: line
+events: Ir Dr Dw
+fl=submission.s
+fn=add
+10 4 1 1
+11 2
+cfn=helper
+calls=1 20
+12 100 50 50
+fn=helper
+20 3 1
+fn=add'2
+10 1 1 1
+fn=main
+30 1000 100 100
+"""
+
+FINAL_DUMP = """version: 1
+desc: Trigger: Program termination
+events: Ir Dr Dw
+fn=add
+10 7 7 7
+"""
+
+
+def test_exclusive_cost_of_the_function_is_summed(tmp_path):
+    dump_path = tmp_path / "callgrind.out.1"
+    dump_path.write_text(TEST_DUMP)
+
+    performance = parse_callgrind_dump(str(dump_path), "add")
+
+    # The inclusive cost of the call to helper is not part of add, its recursion levels are
+    assert performance.events == {"Ir": 7, "Dr": 2, "Dw": 2}
+
+
+def test_dump_at_termination_does_not_belong_to_a_test(tmp_path):
+    dump_path = tmp_path / "callgrind.out.1"
+    dump_path.write_text(FINAL_DUMP)
+
+    assert parse_callgrind_dump(str(dump_path), "add") is None
+
+
+def test_batch_dumps_are_read_in_order(tmp_path):
+    for part, instructions in ((2, 20), (10, 30), (1, 10)):
+        (tmp_path / f"callgrind.out.{part}").write_text(TEST_DUMP.replace("10 4 1 1", f"10 {instructions} 1 1"))
+    (tmp_path / "callgrind.out.11").write_text(FINAL_DUMP)
+    (tmp_path / "callgrind.out.log").write_text("")
+
+    performances = parse_callgrind_batch_output(str(tmp_path), "callgrind.out", "add")
+
+    assert [performance.events["Ir"] for performance in performances] == [13, 23, 33]
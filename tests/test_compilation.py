@@ -0,0 +1,35 @@
+import shutil
+from os import path
+
+from conftest import JUDGE_DIRECTORY, load_config, load_plan
+from evaluation.compilation import RENDERING_MODULES, HarnessCompilation, determine_compile_command_and_options, \
+    harness_cache_key
+from utils.disk_cache import DiskCache
+
+
+def test_evicted_cache_entry_compiles_the_harness(exercise, monkeypatch):
+    config = load_config({**exercise.raw_config, "harness_cache_dir": str(exercise.directory / "harness-cache")})
+    compile_command, compile_options = determine_compile_command_and_options(config.assembly)
+    # The entry is found, but another judge evicts it before it is copied
+    monkeypatch.setattr(DiskCache, "get", lambda cache, key: path.join(cache.directory, key))
+
+    object_path = HarnessCompilation(config, load_plan(config), compile_command, compile_options).wait()
+
+    assert path.getsize(object_path) > 0
+
+
+def test_key_depends_on_the_code_that_renders_the_harness(exercise, tmp_path):
+    judge = tmp_path / "judge"
+    shutil.copytree(path.join(JUDGE_DIRECTORY, "templates"), judge / "templates")
+    for module in RENDERING_MODULES:
+        (judge / module).parent.mkdir(exist_ok=True)
+        shutil.copyfile(path.join(JUDGE_DIRECTORY, module), judge / module)
+    config = load_config({**exercise.raw_config, "judge": str(judge)})
+    plan = load_plan(config)
+    compile_command, compile_options = determine_compile_command_and_options(config.assembly)
+    key = harness_cache_key(config, plan, compile_command, compile_options)
+
+    with open(judge / "evaluation" / "arguments.py", "a") as module_file:
+        module_file.write("\n# changed\n")
+
+    assert harness_cache_key(config, plan, compile_command, compile_options) != key
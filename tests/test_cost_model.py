@@ -0,0 +1,31 @@
+import pytest
+
+from conftest import load_config
+from evaluation import profiling
+from evaluation.cost_model import format_cycles, parse_cost_model
+
+
+def test_fractional_weights_are_kept():
+    cost_model = parse_cost_model({"Ir": 0.5, "Dr": 1, "Dw": 0})
+
+    assert cost_model == {"Ir": 0.5, "Dr": 1}
+    cycles = profiling.TestPerformance(events={"Ir": 3, "Dr": 2, "Dw": 7}).cycles(cost_model)
+    assert cycles == 3.5
+    assert format_cycles(cycles) == "3.5"
+
+
+def test_non_numeric_weights_are_rejected():
+    with pytest.raises(ValueError, match="Ir"):
+        parse_cost_model({"Ir": "1"})
+
+
+def test_legacy_cycle_factors_may_be_strings(exercise):
+    config = load_config({
+        **exercise.raw_config,
+        "measure_performance": True,
+        "performance_cycle_factor_instructions": "1",
+        "performance_cycle_factor_data_reads": "2.5",
+        "performance_cycle_factor_data_writes": 0,
+    })
+
+    assert config.cost_model == {"Ir": 1, "Dr": 2.5}
@@ -0,0 +1,60 @@
+import json
+import os
+import stat
+import subprocess
+import sys
+import time
+from os import path
+
+import pytest
+
+from conftest import JUDGE_DIRECTORY
+
+JUDGE_SERVER = path.join(JUDGE_DIRECTORY, "judge_server.py")
+
+
+@pytest.fixture
+def socket_path(tmp_path):
+    socket_path = str(tmp_path / "judge.sock")
+    server = subprocess.Popen([sys.executable, JUDGE_SERVER, "serve", socket_path],
+                              env={**os.environ, "ASSEMBLY_JUDGE_SERVER_MAX_JUDGEMENTS": "2"})
+    while not path.exists(socket_path):
+        time.sleep(0.05)
+    yield socket_path
+    server.kill()
+    server.wait()
+
+
+def judge(socket_path: str, raw_config: dict) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, JUDGE_SERVER, "judge", socket_path], input=json.dumps(raw_config),
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, timeout=60)
+
+
+def test_judgements_are_closed(socket_path, exercise):
+    results = [judge(socket_path, exercise.raw_config) for _ in range(3)]
+
+    for result in results:
+        assert result.returncode == 0
+        assert '"correct"' in result.stdout.splitlines()[-1]
+
+
+def test_crashed_judgement_fails_the_client(socket_path, exercise):
+    result = judge(socket_path, {**exercise.raw_config, "workdir": str(exercise.directory / "missing")})
+
+    assert result.returncode == 1
+
+
+def test_socket_is_only_accessible_to_its_owner(socket_path):
+    assert stat.S_IMODE(os.stat(socket_path).st_mode) == 0o600
+
+
+def test_server_does_not_replace_other_files(tmp_path):
+    socket_path = tmp_path / "judge.sock"
+    socket_path.write_text("not a socket")
+
+    result = subprocess.run([sys.executable, JUDGE_SERVER, "serve", str(socket_path)], stderr=subprocess.PIPE,
+                            universal_newlines=True, timeout=60)
+
+    assert result.returncode == 1
+    assert "not a socket" in result.stderr
+    assert socket_path.read_text() == "not a socket"
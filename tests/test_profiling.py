@@ -0,0 +1,19 @@
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from evaluation.profiling import qemu_plugin_path
+
+
+def test_failing_qemu_plugin_build_is_reported(tmp_path, monkeypatch):
+    monkeypatch.delenv("ASSEMBLY_JUDGE_QEMU_PLUGIN", raising=False)
+    (tmp_path / "plugins").mkdir()
+    (tmp_path / "plugins" / "function_counter.c").write_text("#error plugin does not compile\n")
+    workdir = tmp_path / "workdir"
+    workdir.mkdir()
+    config = SimpleNamespace(judge=str(tmp_path), harness_cache_dir=None, workdir=str(workdir))
+
+    with pytest.raises(ValueError, match="plugin does not compile"):
+        qemu_plugin_path(config)
+    assert os.listdir(workdir) == []
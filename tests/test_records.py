@@ -0,0 +1,47 @@
+from conftest import load_config
+from evaluation.run import RECORD_SEPARATOR, parse_records, run_test_batch
+
+
+def record(*fields: str) -> str:
+    return RECORD_SEPARATOR + "\t".join(fields) + "\n"
+
+
+def test_complete_records_are_split_into_their_fields():
+    stdout = "output of the tested function" + record("0", "0", "3", "", "", "") + record("1", "0", "-2", "0:4", "", "")
+
+    assert parse_records(stdout) == [["0", "0", "3", "", "", ""], ["1", "0", "-2", "0:4", "", ""]]
+
+
+def test_incomplete_records_are_none():
+    complete = record("0", "0", "3", "", "", "")
+    truncated = RECORD_SEPARATOR + "1\t0\t12"
+    failed = record("2", "1", "", "", "", "")
+    missing_fields = record("3", "0", "12")
+
+    assert parse_records(complete + failed + missing_fields + truncated) == \
+        [["0", "0", "3", "", "", ""], None, None, None]
+
+
+def test_last_field_keeps_its_tabs():
+    stdout = record("0", "0", "3", "", "", "rbx was not preserved\tr12 was not preserved")
+
+    assert parse_records(stdout)[0][5] == "rbx was not preserved\tr12 was not preserved"
+
+
+def test_output_after_the_newline_is_not_part_of_the_record():
+    stdout = record("0", "0", "3", "", "", "") + "printed\tby the function"
+
+    assert parse_records(stdout) == [["0", "0", "3", "", "", ""]]
+
+
+def test_batch_that_crashes_halfway_misses_the_remaining_tests(exercise):
+    config = load_config({**exercise.raw_config, "check_calling_convention": False})
+    # The second test crashes halfway through its record
+    program = exercise.directory / "program"
+    program.write_text("#!/bin/sh\nprintf '\\036%s\\t0\\t3\\t\\t\\t\\n\\036%s\\t0\\t1' 0 1\nkill -SEGV $$\n")
+    program.chmod(0o755)
+
+    results = run_test_batch(config.translator, str(program), [0, 1, 2], config, timeout=10)
+
+    assert list(results) == [0]
+    assert results[0].generated == "3"
@@ -0,0 +1,56 @@
+import shutil
+from os import path
+
+import pytest
+
+import evaluation.result_cache
+from conftest import CORRECT_SUBMISSION, JUDGE_DIRECTORY, load_config, load_plan
+from dodona.dodona_config import AssemblyLanguage
+from evaluation.result_cache import normalise_submission, result_cache_key
+
+
+def test_key_depends_on_the_trampoline_and_the_judge_version(exercise, tmp_path, monkeypatch):
+    # A copy of the judge's templates, whose trampoline can be changed
+    judge = tmp_path / "judge"
+    shutil.copytree(path.join(JUDGE_DIRECTORY, "templates"), judge / "templates")
+    config = load_config({**exercise.raw_config, "judge": str(judge)})
+    plan = load_plan(config)
+    key = result_cache_key(config, plan)
+
+    with open(judge / "templates" / "cc_trampoline" / "x86-64.s", "a") as trampoline_file:
+        trampoline_file.write("    nop\n")
+    changed_trampoline_key = result_cache_key(config, plan)
+    monkeypatch.setattr(evaluation.result_cache, "JUDGE_VERSION", "next")
+
+    assert len({key, changed_trampoline_key, result_cache_key(config, plan)}) == 3
+
+
+@pytest.mark.parametrize("assembly_language, comment", [
+    (AssemblyLanguage.X86_64_ATT, "# add them"),
+    (AssemblyLanguage.ARM_64, "// add them"),
+    (AssemblyLanguage.ARM_32, "@ add them"),
+    (AssemblyLanguage.X86_64_ATT, "/* add\n   them */"),
+])
+def test_comments_and_whitespace_are_ignored(assembly_language, comment):
+    source = "f:\n    add r0, r1\n    ret\n"
+    commented_source = f"{comment}\nf:   {comment}\n\n\tadd   r0,  r1 {comment}\n    ret"
+
+    assert normalise_submission(commented_source, assembly_language) == \
+        normalise_submission(source, assembly_language)
+
+
+@pytest.mark.parametrize("literal", ['.ascii "a  b"', '.ascii "a # b"', '.ascii "a \\" # b"', "movb $' , %al",
+                                     "movb $'#', %al"])
+def test_literals_are_kept(literal):
+    assert normalise_submission(f"  {literal}  # comment", AssemblyLanguage.X86_64_ATT) == literal
+
+
+def test_submissions_that_differ_inside_a_literal_do_not_share_a_key(exercise):
+    keys = set()
+    for literal in ('"a b"', '"a  b"'):
+        with open(exercise.raw_config["source"], "w") as source_file:
+            source_file.write(f'{CORRECT_SUBMISSION}\n.ascii {literal}\n')
+        config = load_config(exercise.raw_config)
+        keys.add(result_cache_key(config, load_plan(config)))
+
+    assert len(keys) == 2
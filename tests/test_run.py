@@ -0,0 +1,26 @@
+import time
+
+import pytest
+
+from conftest import load_config
+from evaluation.run import ForkServer, run_test
+from exceptions import evaluation_exceptions
+
+
+def test_fork_server_fallback_keeps_the_deadline(exercise, monkeypatch):
+    config = load_config({**exercise.raw_config, "fork_server": True})
+    program = exercise.directory / "program"
+    program.write_text("#!/bin/sh\nsleep 0.5\n")
+    program.chmod(0o755)
+
+    def unresponsive_run(fork_server, test_id, timeout=None):
+        time.sleep(0.8)
+        return None
+
+    monkeypatch.setattr(ForkServer, "run", unresponsive_run)
+    fork_server = ForkServer.__new__(ForkServer)
+
+    start = time.monotonic()
+    with pytest.raises(evaluation_exceptions.TestTimeLimitExceeded):
+        run_test(config.translator, str(program), 0, config, timeout=1.0, fork_server=fork_server)
+    assert time.monotonic() - start < 1.2
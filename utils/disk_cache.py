@@ -0,0 +1,88 @@
+"""
+util file with a size-bounded, content-addressed file cache
+"""
+
+import hashlib
+import os
+import shutil
+import tempfile
+from typing import Iterable, Optional, Union
+
+
+def content_hash(parts: Iterable[Union[str, bytes]]) -> str:
+    """Hashes the given parts into a cache key. Parts are length-prefixed, so their boundaries are part of the key."""
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode("utf-8")
+        digest.update(len(part).to_bytes(8, "little"))
+        digest.update(part)
+    return digest.hexdigest()
+
+
+class DiskCache:
+    """
+    Stores files in a directory under a key, evicting the least recently used files once the total size of the cache
+    exceeds max_size bytes. The modification time of an entry is its last use.
+    Entries are written atomically, such that concurrent judges can share a cache directory.
+    """
+
+    DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+
+    def __init__(self, directory: str, max_size: int = DEFAULT_MAX_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+        os.makedirs(directory, exist_ok=True)
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def get(self, key: str) -> Optional[str]:
+        """Returns the path of the entry stored under key, or None if there is no such entry."""
+        entry_path = self._entry_path(key)
+        try:
+            os.utime(entry_path)
+        except OSError:
+            return None
+        return entry_path
+
+    def put(self, key: str, file_path: str):
+        """Stores a copy of the file at file_path under key."""
+        file_descriptor, temporary_path = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+        try:
+            with os.fdopen(file_descriptor, "wb") as temporary_file, open(file_path, "rb") as source_file:
+                shutil.copyfileobj(source_file, temporary_file)
+            os.replace(temporary_path, self._entry_path(key))
+        except OSError:
+            # A cache that cannot be written to is not fatal, the entry is simply not cached
+            try:
+                os.unlink(temporary_path)
+            except OSError:
+                pass
+            return
+        self.evict()
+
+    def evict(self):
+        """Removes the least recently used entries until the cache fits in max_size bytes."""
+        entries = []
+        total_size = 0
+        with os.scandir(self.directory) as directory_entries:
+            for entry in directory_entries:
+                if entry.name.startswith(".tmp-") or not entry.is_file(follow_symlinks=False):
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total_size += stat.st_size
+
+        entries.sort()
+        for _, size, entry_path in entries:
+            if total_size <= self.max_size:
+                break
+            try:
+                os.unlink(entry_path)
+            except OSError:
+                pass
+            total_size -= size
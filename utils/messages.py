@@ -69,3 +69,22 @@ def unknown_argument_type(judge: SimpleNamespace, translator: Translator, ty: st
         pass
 
     judge.status = translator.error_status(ErrorType.INTERNAL_ERROR)
+
+
+def tests_not_executed(translator: Translator, amount: int):
+    """Tell the students that the remaining tests were skipped"""
+    with Message(
+            description=translator.translate(Translator.Text.TESTS_NOT_EXECUTED, amount=amount),
+            format=MessageFormat.TEXT
+    ):
+        pass
+
+
+def result_cache_hit(translator: Translator):
+    """Tell the teacher that the judgement was replayed from the result cache"""
+    with Message(
+            permission=MessagePermission.STAFF,
+            description=translator.translate(Translator.Text.RESULT_CACHE_HIT),
+            format=MessageFormat.TEXT
+    ):
+        pass
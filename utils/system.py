@@ -0,0 +1,46 @@
+"""
+util file with functions to query the resources available to the judge
+"""
+
+import math
+import os
+
+
+def _cgroup_cpu_quota():
+    """Returns the CPU quota of the container as a (possibly fractional) number of CPUs, or None if unlimited."""
+    # cgroup v2: "<quota> <period>" or "max <period>"
+    try:
+        with open("/sys/fs/cgroup/cpu.max", "r") as cpu_max_file:
+            quota, period = cpu_max_file.read().split()
+            if quota != "max":
+                return int(quota) / int(period)
+            return None
+    except (OSError, ValueError):
+        pass
+
+    # cgroup v1: quota is -1 when unlimited
+    try:
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us", "r") as quota_file, \
+                open("/sys/fs/cgroup/cpu/cpu.cfs_period_us", "r") as period_file:
+            quota = int(quota_file.read())
+            period = int(period_file.read())
+            if quota > 0 and period > 0:
+                return quota / period
+    except (OSError, ValueError):
+        pass
+
+    return None
+
+
+def available_cpu_count() -> int:
+    """Number of CPUs the judge may use, taking both the CPU affinity and the container's CPU quota into account."""
+    try:
+        count = len(os.sched_getaffinity(0))
+    except AttributeError:
+        count = os.cpu_count() or 1
+
+    quota = _cgroup_cpu_quota()
+    if quota is not None:
+        count = min(count, math.ceil(quota))
+
+    return max(1, count)
@@ -0,0 +1,80 @@
+"""
+util file for recording timed spans of the judge's stages, exported in the Chrome trace event format
+(viewable in chrome://tracing or https://ui.perfetto.dev)
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import List, Optional
+
+TRACE_FILE_NAME = "trace.json"
+
+
+class Tracer:
+    """Collects completed spans as trace events, timestamps are relative to the creation of the tracer"""
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.events: List[dict] = []
+
+    def record(self, name: str, start: float, end: float, **args):
+        """Records a span that started and ended at the given time.perf_counter() values"""
+        # list.append is atomic, spans can be recorded from the worker threads
+        self.events.append({
+            "name": name,
+            "ph": "X",
+            "ts": (start - self.origin) * 1e6,
+            "dur": (end - start) * 1e6,
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+            "args": args,
+        })
+
+    @contextmanager
+    def span(self, name: str, **args):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, start, time.perf_counter(), **args)
+
+    def write(self, file_path: str):
+        with open(file_path, "w") as trace_file:
+            json.dump({"traceEvents": self.events, "displayTimeUnit": "ms"}, trace_file)
+
+
+_tracer: Optional[Tracer] = None
+_trace_file_path: Optional[str] = None
+_no_span = nullcontext()
+
+
+def start_tracing(file_path: str):
+    """Starts recording spans, they are written to file_path when the judge exits"""
+    global _tracer, _trace_file_path
+    _tracer = Tracer()
+    _trace_file_path = file_path
+    atexit.register(_tracer.write, file_path)
+
+
+def finish_tracing():
+    """Writes the recorded spans right away, for processes that exit without running the exit handlers"""
+    if _tracer is not None:
+        atexit.unregister(_tracer.write)
+        _tracer.write(_trace_file_path)
+
+
+def span(name: str, **args):
+    """Context manager that records its body as a span, if tracing is enabled"""
+    if _tracer is None:
+        return _no_span
+    return _tracer.span(name, **args)
+
+
+def record_span(name: str, start: float, **args):
+    """Records a span from start (a time.perf_counter() value) until now, if tracing is enabled"""
+    if _tracer is not None:
+        _tracer.record(name, start, time.perf_counter(), **args)